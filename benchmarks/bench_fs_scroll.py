@@ -0,0 +1,102 @@
+"""Time scrolling a directory of tagged pdfs in the file system view
+
+The view is painted with the tag column served from the cache of tag cells,
+and with the previous `data`, which looked up and joined the tags of every
+visible row on every repaint.
+
+Usage: python benchmarks/bench_fs_scroll.py [number of pdfs]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import Qt  # noqa: E402
+from PyQt6.QtGui import QColor  # noqa: E402
+from PyQt6.QtWidgets import QApplication, QTreeView  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from PaperManager.components.database import PMDatabase  # noqa: E402
+from PaperManager.components.filesystem_viewer.fsviewer import FSModel  # noqa: E402
+
+N_TAGS = 50
+PASSES = 3
+
+
+class LookupFSModel(FSModel):
+    """The tag column as before the cache"""
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        isTagCol = False
+        if index.isValid():
+            isTagCol = index.column() == self.columnCount(index.parent()) - 1
+            info = self.fileInfo(index)
+            path = info.absoluteFilePath()
+            if path:
+                if isTagCol:
+                    if role == Qt.ItemDataRole.DisplayRole:
+                        return ", ".join(self.db.get_paper_tags(path))
+                    elif role == Qt.ItemDataRole.ForegroundRole:
+                        return QColor("blue")
+        if not isTagCol:
+            return super(FSModel, self).data(index, role)
+
+
+def make_library(directory: str, n_pdfs: int) -> None:
+    for i in range(n_pdfs):
+        with open(os.path.join(directory, f"p{i:05}.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4 " + str(i).encode() * 64)
+
+
+def scroll(view: QTreeView) -> float:
+    """Seconds per repaint, scrolling a page at a time through the view"""
+    bar = view.verticalScrollBar()
+    repaints = 0
+    start = time.perf_counter()
+    for _ in range(PASSES):
+        for value in range(bar.minimum(), bar.maximum() + 1, bar.pageStep()):
+            bar.setValue(value)
+            view.viewport().repaint()
+            repaints += 1
+    return (time.perf_counter() - start) / repaints
+
+
+def main(n_pdfs: int) -> None:
+    app = QApplication(sys.argv)
+    tmpdir = tempfile.mkdtemp()
+    library = os.path.join(tmpdir, "library")
+    os.mkdir(library)
+    make_library(library, n_pdfs)
+    db = PMDatabase(os.path.join(tmpdir, "db.sqlite"), lazy=True)
+    db.update_dir(library)
+    for i, name in enumerate(sorted(os.listdir(library))):
+        tags = [f"tag{(i * k) % N_TAGS}" for k in (1, 3, 7)]
+        db.set_paper_tags(os.path.join(library, name), tags)
+
+    print(f"{n_pdfs} pdfs")
+    for label, model_class in (("lookup", LookupFSModel), ("cached", FSModel)):
+        model = model_class(None, db)
+        view = QTreeView()
+        view.setModel(model)
+        view.setUniformRowHeights(True)
+        view.resize(800, 600)
+        loaded = []
+        model.directoryLoaded.connect(loaded.append)
+        view.setRootIndex(model.setRootPath(library))
+        # As shown in the file system view
+        for section in (1, 2, 3):
+            view.header().hideSection(section)
+        view.show()
+        while library not in loaded:
+            app.processEvents()
+        scroll(view)  # warm up
+        elapsed = scroll(view)
+        print(f"  {label:6} {elapsed * 1000:7.2f} ms per repaint")
+    db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
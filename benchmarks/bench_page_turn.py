@@ -0,0 +1,77 @@
+"""Time turning the pages of a pdf in the viewer, before and after rendering
+at the size shown instead of at 2x through a PNG round trip
+
+Usage: python benchmarks/bench_page_turn.py [pdf] [view height in pixels]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import fitz  # noqa: E402
+from PyQt6.QtCore import QByteArray, Qt  # noqa: E402
+from PyQt6.QtGui import QGuiApplication, QImage, QPixmap  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from PaperManager.components.pdf_viewer.render import (  # noqa: E402
+    fit_zoom,
+    render_page,
+)
+
+N_PAGES = 20
+
+
+def make_pdf(path: str) -> None:
+    """A text-heavy pdf, like a paper"""
+    doc = fitz.open()
+    for i in range(N_PAGES):
+        page = doc.new_page()
+        text = " ".join(f"word{j}" for j in range(i, i + 12))
+        for line in range(60):
+            page.insert_text((50, 60 + line * 12), f"{line:02} {text}", fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def turn_before(doc: fitz.Document, number: int, height: int) -> QPixmap:
+    doc[number].get_displaylist()
+    pix = doc.get_page_pixmap(number, matrix=fitz.Matrix(2, 2))
+    img = QImage()
+    img.loadFromData(QByteArray(pix.tobytes()))
+    pixmap = QPixmap.fromImage(img)
+    return pixmap.scaledToHeight(height, Qt.TransformationMode.SmoothTransformation)
+
+
+def turn_after(doc: fitz.Document, number: int, height: int) -> QPixmap:
+    page = doc[number]
+    return QPixmap.fromImage(render_page(page, fit_zoom(page.rect, height)))
+
+
+def main(path: str, height: int) -> None:
+    app = QGuiApplication(sys.argv)  # noqa: F841
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(), "paper.pdf")
+        make_pdf(path)
+    doc = fitz.open(path)
+    print(f"{doc.page_count} pages, view height {height} px")
+    for label, turn in (("before", turn_before), ("after", turn_after)):
+        times = []
+        for number in range(doc.page_count):
+            start = time.perf_counter()
+            turn(doc, number, height)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        mean = sum(times) / len(times)
+        p95 = times[int(len(times) * 0.95) - 1]
+        print(f"  {label:6} mean {mean * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms")
+    doc.close()
+
+
+if __name__ == "__main__":
+    main(
+        sys.argv[1] if len(sys.argv) > 1 else "",
+        int(sys.argv[2]) if len(sys.argv) > 2 else 900,
+    )
@@ -0,0 +1,111 @@
+"""Compare query plans and timings before and after the index migration
+
+Usage: python benchmarks/bench_query_plan.py [number of papers]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+from PyQt6.QtCore import QCoreApplication
+from PyQt6.QtSql import QSqlDatabase, QSqlQuery
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from PaperManager.components import migrations  # noqa: E402
+
+DEVICE = "0x1"
+QUERIES = {
+    "lookup paper by path": """
+    SELECT paperId FROM PaperPaths WHERE path='/lib/d7/p7.pdf'
+    """,
+    "remove tag of path": """
+    SELECT count(*) FROM PaperTags
+    WHERE paperId=(SELECT DISTINCT paperId FROM PaperPaths WHERE path='/lib/d7/p7.pdf')
+    AND tagId=(SELECT id FROM Tags WHERE name='tag7')
+    """,
+    "Papers view": f"""
+    SELECT DISTINCT Papers.name, GROUP_CONCAT(Tags.name, ', ') as Tags
+    FROM Papers, PaperTags, Tags, PaperPaths
+    WHERE Papers.id=PaperTags.paperId AND Tags.id=PaperTags.tagId
+    AND PaperPaths.deviceMacAddr='{DEVICE}' AND PaperPaths.paperId=Papers.id
+    GROUP BY Papers.id ORDER BY Papers.name
+    """,
+    "Tags view": """
+    SELECT DISTINCT Tags.name, count(paperId) AS freq
+    FROM Tags LEFT JOIN PaperTags ON Tags.id=PaperTags.tagId
+    GROUP BY Tags.id HAVING freq>0 ORDER BY freq DESC
+    """,
+    "papers with tag": "SELECT paperId FROM PaperTags WHERE tagId=7",
+}
+
+
+def populate(db: QSqlDatabase, n_papers: int, n_tags: int = 200) -> None:
+    rng = random.Random(0)
+    query = QSqlQuery(db)
+    db.transaction()
+    query.prepare("INSERT INTO Tags(name) VALUES (?)")
+    query.addBindValue([f"tag{i}" for i in range(n_tags)])
+    query.execBatch()
+    query.prepare("INSERT INTO Papers(id,name) VALUES (?,?)")
+    query.addBindValue(list(range(1, n_papers + 1)))
+    query.addBindValue([f"p{i}.pdf" for i in range(1, n_papers + 1)])
+    query.execBatch()
+    query.prepare("INSERT INTO PaperPaths(paperId,path,deviceMacAddr) VALUES (?,?,?)")
+    ids = list(range(1, n_papers + 1))
+    query.addBindValue(ids)
+    query.addBindValue([f"/lib/d{i % 100}/p{i}.pdf" for i in ids])
+    query.addBindValue([DEVICE] * n_papers)
+    query.execBatch()
+    pairs = {(rng.randint(1, n_papers), rng.randint(1, n_tags)) for _ in ids * 3}
+    paperIds, tagIds = map(list, zip(*pairs))
+    query.prepare("INSERT INTO PaperTags(paperId,tagId) VALUES (?,?)")
+    query.addBindValue(paperIds)
+    query.addBindValue(tagIds)
+    query.execBatch()
+    db.commit()
+    query.exec("ANALYZE")
+    query.finish()
+
+
+def run(db: QSqlDatabase, sql: str, repeat: int = 5) -> tuple:
+    query = QSqlQuery(db)
+    query.exec(f"EXPLAIN QUERY PLAN {sql}")
+    plan = []
+    while query.next():
+        plan.append(query.value(3))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        query.exec(sql)
+        while query.next():
+            pass
+    elapsed = (time.perf_counter() - start) / repeat
+    query.finish()
+    return plan, elapsed
+
+
+def main(n_papers: int) -> None:
+    app = QCoreApplication(sys.argv)  # noqa: F841
+    tmpdir = tempfile.mkdtemp()
+    results = {}
+    for label, version in (("before", 3), ("after", migrations.LATEST_VERSION)):
+        db = QSqlDatabase.addDatabase("QSQLITE", label)
+        db.setDatabaseName(os.path.join(tmpdir, f"{label}.sqlite"))
+        db.open()
+        migrations.migrate(db, target=version)
+        populate(db, n_papers)
+        results[label] = {name: run(db, sql) for name, sql in QUERIES.items()}
+        db.close()
+        del db
+        QSqlDatabase.removeDatabase(label)
+    print(f"{n_papers} papers")
+    for name in QUERIES:
+        print(f"\n== {name}")
+        for label in ("before", "after"):
+            plan, elapsed = results[label][name]
+            print(f"  {label:6} {elapsed * 1000:9.2f} ms  " + " | ".join(plan))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,84 @@
+"""Compare memory of the tag cache as lists of names and as a TagIndex
+
+Usage: python benchmarks/bench_tag_memory.py [number of papers]
+"""
+
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from PaperManager.components.tagindex import TagIndex  # noqa: E402
+
+
+def make_library(n_papers: int, n_tags: int = 300) -> list:
+    rng = random.Random(0)
+    return [
+        (i, f"/lib/d{i % 100}/p{i}.pdf", rng.sample(range(n_tags), rng.randint(0, 6)))
+        for i in range(1, n_papers + 1)
+    ]
+
+
+def rows(library: list):
+    """Rows as read from database, with a new string for every tag name"""
+    for paperId, path, tagIds in library:
+        yield paperId, path, [f"tag{t}" for t in tagIds]
+
+
+def build_lists(library: list) -> dict:
+    """Cache of the original implementation: path to list of tag names"""
+    paperTags = {}
+    for _, path, tags in rows(library):
+        paperTags[path] = list(set(paperTags.get(path, []) + tags))
+    return paperTags
+
+
+def build_index(library: list) -> TagIndex:
+    index = TagIndex()
+    for paperId, path, tags in rows(library):
+        index.add_path(paperId, path)
+        for tag in tags:
+            index.add_tag(paperId, tag)
+    return index
+
+
+def tag_bytes_of_lists(paperTags: dict) -> int:
+    size = 0
+    for tags in paperTags.values():
+        size += sys.getsizeof(tags) + sum(sys.getsizeof(t) for t in tags)
+    return size
+
+
+def tag_bytes_of_index(index: TagIndex) -> int:
+    size = sum(sys.getsizeof(r.tags) for r in index.papers.values() if r.tags)
+    size += sum(sys.getsizeof(b) for b in index.tag_papers)
+    return size + sum(sys.getsizeof(n) for n in index.tag_names)
+
+
+def main(n_papers: int) -> None:
+    library = make_library(n_papers)
+    print(f"{n_papers} papers")
+    for label, build, tag_bytes in (
+        ("lists", build_lists, tag_bytes_of_lists),
+        ("TagIndex", build_index, tag_bytes_of_index),
+    ):
+        tracemalloc.start()
+        cache = build(library)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del cache
+        start = time.perf_counter()
+        cache = build(library)
+        elapsed = time.perf_counter() - start
+        print(
+            f"  {label:8} {size / 2**20:6.1f} MiB in total,"
+            f" {tag_bytes(cache) / 2**20:6.1f} MiB for tags,"
+            f" {elapsed * 1000:5.0f} ms to build"
+        )
+        del cache
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,106 @@
+"""Compare boolean tag queries on in-memory bitmaps and in SQL
+
+Usage: python benchmarks/bench_tag_query.py [number of papers]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from PyQt6.QtCore import QCoreApplication
+from PyQt6.QtSql import QSqlDatabase, QSqlQuery
+
+from bench_query_plan import populate
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from PaperManager.components import migrations, tagquery  # noqa: E402
+from PaperManager.components.tagindex import TagIndex, bitmap_ids  # noqa: E402
+
+QUERIES = [
+    "tag1",
+    "tag1 OR tag2 OR tag3",
+    "tag1 AND (tag2 OR tag3)",
+    "NOT tag1",
+    "(tag1 OR tag2 OR tag3 OR tag4) AND NOT (tag5 OR tag6)",
+]
+
+
+def to_sql(node: tuple) -> str:
+    """The equivalent query in SQL, as compound selects of paperIds"""
+    kind, value = node
+    if kind == "tag":
+        return (
+            "SELECT paperId FROM PaperTags JOIN Tags ON Tags.id=PaperTags.tagId"
+            f" WHERE Tags.name='{value}'"
+        )
+    if kind == "not":
+        return (
+            "SELECT paperId FROM PaperPaths"
+            f" EXCEPT SELECT paperId FROM ({to_sql(value)})"
+        )
+    operator = " INTERSECT " if kind == "and" else " UNION "
+    return operator.join(f"SELECT paperId FROM ({to_sql(child)})" for child in value)
+
+
+def load_index(db: QSqlDatabase) -> TagIndex:
+    index = TagIndex()
+    query = QSqlQuery(db)
+    query.exec("SELECT paperId, path FROM PaperPaths")
+    while query.next():
+        index.add_path(query.value(0), query.value(1))
+    query.exec(
+        "SELECT PaperTags.paperId, Tags.name FROM PaperTags"
+        " JOIN Tags ON PaperTags.tagId=Tags.id"
+    )
+    while query.next():
+        index.add_tag(query.value(0), query.value(1))
+    query.finish()
+    return index
+
+
+def time_engine(index: TagIndex, expression: str, repeat: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        node = tagquery.parse(expression)
+        bits = tagquery.evaluate(node, index.papers_with, index.library_papers())
+        ids = bitmap_ids(bits)
+    return ids, (time.perf_counter() - start) / repeat
+
+
+def time_sql(db: QSqlDatabase, expression: str, repeat: int) -> tuple:
+    sql = to_sql(tagquery.parse(expression))
+    query = QSqlQuery(db)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        query.exec(sql)
+        ids = []
+        while query.next():
+            ids.append(query.value(0))
+    elapsed = (time.perf_counter() - start) / repeat
+    query.finish()
+    return sorted(ids), elapsed
+
+
+def main(n_papers: int, repeat: int = 5) -> None:
+    app = QCoreApplication(sys.argv)  # noqa: F841
+    db = QSqlDatabase.addDatabase("QSQLITE")
+    db.setDatabaseName(os.path.join(tempfile.mkdtemp(), "query.sqlite"))
+    db.open()
+    migrations.migrate(db)
+    populate(db, n_papers, n_tags=300)
+    index = load_index(db)
+    print(f"{n_papers} papers, 300 tags")
+    for expression in QUERIES:
+        ids, engine = time_engine(index, expression, repeat)
+        sqlIds, sql = time_sql(db, expression, repeat)
+        assert ids == sqlIds, expression
+        print(
+            f"  {expression:55} {len(ids):7} papers"
+            f" {engine * 1000:8.2f} ms bitmaps {sql * 1000:8.2f} ms SQL"
+        )
+    db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,82 @@
+"""Time showing the thumbnails of a library of pdfs, rendered by opening each
+pdf or read from the thumbnail pack written on a previous launch
+
+Usage: python benchmarks/bench_thumbnails.py [number of pdfs]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import fitz  # noqa: E402
+from PyQt6.QtGui import QGuiApplication, QImage, QPixmap  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from PaperManager.components import workers  # noqa: E402
+from PaperManager.components.hashing import prefilter_hash  # noqa: E402
+from PaperManager.components.thumbnails import (  # noqa: E402
+    ThumbnailStore,
+    pdf_thumbnail_key,
+    render_thumbnail,
+)
+
+
+def make_pdfs(directory: str, n: int) -> list:
+    """Single page pdfs of text, each different"""
+    paths = []
+    for i in range(n):
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((50, 60), f"Paper {i}", fontsize=24)
+        for line in range(40):
+            page.insert_text((50, 100 + line * 14), f"{i} line {line}", fontsize=9)
+        path = os.path.join(directory, f"paper{i:05}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def main(n: int) -> None:
+    app = QGuiApplication(sys.argv)  # noqa: F841
+    directory = tempfile.mkdtemp()
+    paths = make_pdfs(directory, n)
+    # Known to database once the library is scanned
+    prehashes = {path: prefilter_hash(path) for path in paths}
+    cache_dir = os.path.join(directory, "thumbnails")
+    print(f"{n} pdfs")
+
+    start = time.perf_counter()
+    for path in paths:
+        QPixmap.fromImage(QImage.fromData(render_thumbnail(path)))
+    elapsed = time.perf_counter() - start
+    print(f"  open and render each pdf         {elapsed:7.2f} s")
+
+    start = time.perf_counter()
+    store = ThumbnailStore(cache_dir)
+    images = workers.process_pool().map(render_thumbnail, paths, chunksize=16)
+    for path, image in zip(paths, images):
+        store.put(pdf_thumbnail_key(path, prehashes[path]), image)
+    store.close()
+    workers.shutdown()
+    elapsed = time.perf_counter() - start
+    print(f"  first launch, render in pool     {elapsed:7.2f} s")
+
+    start = time.perf_counter()
+    store = ThumbnailStore(cache_dir)
+    opened = time.perf_counter() - start
+    for path in paths:
+        image = store.get(pdf_thumbnail_key(path, prehashes[path]))
+        QPixmap.fromImage(QImage.fromData(image))
+    elapsed = time.perf_counter() - start
+    store.close()
+    size = os.path.getsize(os.path.join(cache_dir, "thumbnails.pack"))
+    print(f"  later launch, read from pack     {elapsed:7.2f} s")
+    print(f"    index loaded in {opened * 1000:.1f} ms, pack {size / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
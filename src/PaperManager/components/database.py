@@ -1,194 +1,567 @@
 import os
+import sys
+import time
+import dataclasses
+import threading
+import typing
+import posixpath
 from pathlib import Path
 from enum import Enum
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass, field
 from uuid import getnode as getMacAddr
 from PyQt6.QtSql import QSqlDatabase, QSqlQuery
 
+from . import hashing, migrations, tagquery, workers
+from .writer import PMDatabaseWriter, checked_exec, checked_exec_batch
+from .writebehind import TagWriteBehind
+from .tagindex import (
+    TagIndex,
+    bitmap_ids,
+    DirectoryLRU,
+    TagCacheStats,
+    PATH_OVERHEAD_BYTES,
+    TAG_MEMBERSHIP_BYTES,
+)
+
+
+# Number of changes written to database per transaction when scanning
+INGEST_BATCH_SIZE = 500
+# Time a connection waits for a lock held by another connection
+SQLITE_BUSY_TIMEOUT_MS = 5000
+CONNECTION_PRAGMAS = (
+    # Readers do not block the writer and vice versa
+    "journal_mode=WAL",
+    # Safe in WAL mode, avoids a sync on every commit
+    "synchronous=NORMAL",
+    # 64 MiB of page cache per connection
+    "cache_size=-65536",
+    # Read through memory-mapped IO, up to 256 MiB
+    "mmap_size=268435456",
+    "temp_store=MEMORY",
+)
+# Memory budget of the tag cache in lazy mode, in bytes
+DEFAULT_TAG_CACHE_BUDGET = 64 * 1024 * 1024
+# Stay below SQLite's default limit on the number of bound parameters
+SQLITE_MAX_PARAMS = 500
+
 
 class Settings(str, Enum):
     LastDirectory = "lastDirectory"
 
 
+@dataclass
+class IngestStats:
+    """Statistics of adding pdfs in a directory to database"""
+
+    seconds: float = 0.0
+    dirs: int = 0  # number of directories visited
+    added: list = field(default_factory=list)  # new or modified pdfs
+    removed: list = field(default_factory=list)  # deleted pdfs
+    new_dirs: list = field(default_factory=list)
+    removed_dirs: list = field(default_factory=list)
+    errors: list = field(default_factory=list)  # batches failed to be written
+
+    @property
+    def files(self) -> int:
+        return len(self.added)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.new_dirs or self.removed_dirs)
+
+    @property
+    def files_per_sec(self) -> float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class PaperIdentity:
+    """A paper identified by the hashes of its content"""
+
+    id: typing.Optional[int]
+    name: str
+    prehash: str
+    digest: typing.Optional[str]  # computed only if prehash collides
+
+
+@dataclass
+class DirManifest:
+    """A directory as recorded in the scan manifest"""
+
+    mtime: int
+    children: list = field(default_factory=list)
+
+
+@dataclass
+class TextHit:
+    """A page of a paper matching a full-text search"""
+
+    paperId: int
+    path: str
+    name: str
+    page: int  # 1 indexed
+    snippet: str
+
+
+@dataclass
+class ScanBatch:
+    """Changes found by scanning, to be written in a single transaction"""
+
+    files: list = field(default_factory=list)  # (path, dir, name, size, mtime)
+    removed_files: list = field(default_factory=list)
+    dirs: list = field(default_factory=list)  # (path, parent, mtime, entryCount)
+    removed_dirs: list = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return (
+            len(self.files)
+            + len(self.removed_files)
+            + len(self.dirs)
+            + len(self.removed_dirs)
+        )
+
+
 class PMDatabase:
-    def __init__(self, databaseName="db.sqlite") -> None:
+    """Database of papers, their locations and tags
+
+    Every thread reads through its own connection, see `connection`. All
+    writes go through a single writer thread, see `PMDatabaseWriter`. In WAL
+    mode, readers then never wait for a long write such as a directory scan.
+    """
+
+    def __init__(
+        self,
+        databaseName="db.sqlite",
+        lazy=False,
+        cache_budget=DEFAULT_TAG_CACHE_BUDGET,
+    ) -> None:
+        """Open the database
+
+        Args:
+            databaseName (str, optional): Defaults to "db.sqlite".
+            lazy (bool, optional): If True, paths and tags are loaded per
+                directory on first use and kept within `cache_budget`,
+                instead of all at startup. Defaults to False.
+            cache_budget (int, optional): memory budget of the lazy tag cache
+                in bytes. Defaults to 64 MiB.
+        """
+        self.databaseName = databaseName
+        # The default connection, used in the GUI thread also by Qt models
         self.db = QSqlDatabase.addDatabase("QSQLITE")
-        self.db.setDatabaseName(databaseName)
-        self.db.open()
+        self._setup_connection(self.db)
+        self.thread_id = threading.get_ident()
+        self.connections = {}  # thread id to connection name of other threads
+        self.connections_lock = threading.Lock()
         self.init()
+        self.writer = PMDatabaseWriter(self._open_connection)
+        self.writer.start()
+        self.tag_writes = TagWriteBehind(self.writer)
         # cache
-        self.papers = {}  # paperId to a set of paths
-        self.paperTags = {}
-        self.load_paper_tags()
+        self.cache_lock = threading.RLock()
+        self.index = TagIndex()
+        self.lazy = lazy
+        self.loaded_dirs = DirectoryLRU(cache_budget)
+        self._evict_flush: typing.Optional[Future] = None
+        if lazy:
+            self.load_tag_bitmaps()
+        else:
+            self.load_paper_tags()
 
     def close(self):
         """Close database"""
+        if not self.db.isOpen():
+            return
+        workers.shutdown()
+        # Commit pending writes
+        self.tag_writes.flush()
+        self.writer.stop()
+        # Let SQLite update statistics used by the query planner, if needed
+        QSqlQuery("PRAGMA optimize", self.db).finish()
         name = self.db.connectionName()
         self.db.close()
-        del self.db
+        self.db = QSqlDatabase()
         QSqlDatabase.removeDatabase(name)
 
+    def connection(self) -> QSqlDatabase:
+        """Get the connection of the calling thread, opened on first use
+
+        Returns:
+            QSqlDatabase: connection for reading
+        """
+        ident = threading.get_ident()
+        if ident == self.thread_id:
+            return self.db
+        with self.connections_lock:
+            name = self.connections.get(ident)
+            if name is None:
+                name = f"PaperManager-reader-{ident}"
+                self.connections[ident] = name
+                return self._open_connection(name)
+        return QSqlDatabase.database(name, open=False)
+
+    def release_connection(self) -> None:
+        """Close the connection of the calling thread, if any"""
+        with self.connections_lock:
+            name = self.connections.pop(threading.get_ident(), None)
+        if name is not None:
+            QSqlDatabase.database(name, open=False).close()
+            QSqlDatabase.removeDatabase(name)
+
+    def _open_connection(self, name: str) -> QSqlDatabase:
+        db = QSqlDatabase.addDatabase("QSQLITE", name)
+        self._setup_connection(db)
+        return db
+
+    def _setup_connection(self, db: QSqlDatabase) -> None:
+        db.setDatabaseName(self.databaseName)
+        # Wait instead of failing when another connection holds a lock
+        db.setConnectOptions(f"QSQLITE_BUSY_TIMEOUT={SQLITE_BUSY_TIMEOUT_MS}")
+        if db.open():
+            query = QSqlQuery(db)
+            for pragma in CONNECTION_PRAGMAS:
+                query.exec(f"PRAGMA {pragma}")
+            query.finish()
+
     def init(self):
-        """Create necessary tables"""
+        """Create necessary tables, or upgrade them to the latest schema"""
 
         if not self.db.isOpen():
             return
+        migrations.migrate(self.db)
 
-        createTableQuery = QSqlQuery(self.db)
-        createTableQuery.exec(
+    def load_paper_tags(self):
+        query = QSqlQuery(self.connection())
+        # All locations of papers, to share tags between duplicates
+        query.exec("SELECT paperId, path FROM PaperPaths")
+        with self.cache_lock:
+            while query.next():
+                self.index.add_path(query.value(0), query.value(1))
+            query.exec(
+                """
+            SELECT PaperTags.paperId, Tags.name
+            FROM PaperTags JOIN Tags ON PaperTags.tagId=Tags.id
             """
-        CREATE TABLE IF NOT EXISTS Settings (
-            key TEXT PRIMARY KEY UNIQUE NOT NULL,
-            value TEXT NOT NULL
-        )
+            )
+            while query.next():
+                self.index.add_tag(query.value(0), query.value(1))
+        query.finish()
+
+    def load_tag_bitmaps(self):
+        """Load which papers have a location and each tag, in lazy mode
+
+        Unlike paths and tags of papers, loaded per directory, the bitmaps
+        cover the whole library so that tag queries and counts are complete.
         """
-        )
-        createTableQuery.exec(
+        query = QSqlQuery(self.connection())
+        with self.cache_lock:
+            query.exec("SELECT DISTINCT paperId FROM PaperPaths")
+            while query.next():
+                self.index.mark_paper(query.value(0))
+            query.exec(
+                """
+            SELECT PaperTags.paperId, Tags.name
+            FROM PaperTags JOIN Tags ON PaperTags.tagId=Tags.id
             """
-        CREATE TABLE IF NOT EXISTS Tags (
-            id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
-            name TEXT UNIQUE NOT NULL,
-            hexColor VARCHAR(8)
-        )
+            )
+            while query.next():
+                self.index.mark_tag(query.value(0), query.value(1))
+        query.finish()
+
+    def load_dir(self, directory_path: str) -> None:
+        """Load the papers in the directory and their tags, in lazy mode
+
+        Args:
+            directory_path (str): absolute posix path of directory
         """
-        )
-        createTableQuery.exec(
+        if not self.lazy:
+            return
+        with self.cache_lock:
+            if self.loaded_dirs.lookup(directory_path):
+                return
+            # Tags of evicted papers may not be written yet
+            if self._evict_flush is not None:
+                self._evict_flush.result()
+                self._evict_flush = None
+            query = QSqlQuery(self.connection())
+            query.prepare(
+                """
+            SELECT PaperPaths.paperId, PaperPaths.path
+            FROM ScanFiles JOIN PaperPaths ON PaperPaths.path=ScanFiles.path
+            WHERE ScanFiles.dir=?
             """
-        CREATE TABLE IF NOT EXISTS Papers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
-            name TEXT UNIQUE NOT NULL
-        )
-        """
-        )
-        createTableQuery.exec(
-            """
-        CREATE TABLE IF NOT EXISTS PaperPaths (
-            paperId INTEGER NOT NULL,
-            path TEXT NOT NULL,
-            deviceMacAddr TEXT NOT NULL,
-            PRIMARY KEY (paperId,path),
-            FOREIGN KEY (paperId) REFERENCES Papers(id)
-        )
-        """
-        )
-        createTableQuery.exec(
-            """
-        CREATE TABLE IF NOT EXISTS PaperTags (
-            paperId INTEGER NOT NULL,
-            tagId INTEGER NOT NULL,
-            PRIMARY KEY (paperId, tagId),
-            FOREIGN KEY (paperId) REFERENCES Papers(id) ON DELETE CASCADE,
-            FOREIGN KEY (tagId) REFERENCES Tags(id) ON DELETE CASCADE
-        )
-        """
-        )
-        createTableQuery.finish()
+            )
+            query.addBindValue(directory_path)
+            query.exec()
+            paths, newPaperIds, pendingTags, size = set(), [], [], 0
+            while query.next():
+                paperId, path = query.value(0), query.value(1)
+                # Papers already in memory have the latest tags
+                if not self.index.has_paper(paperId):
+                    newPaperIds.append(paperId)
+                for tag in self.index.add_path(paperId, path):
+                    pendingTags.append((paperId, tag))
+                paths.add(path)
+                size += sys.getsizeof(path) + PATH_OVERHEAD_BYTES
+            for i in range(0, len(newPaperIds), SQLITE_MAX_PARAMS):
+                chunk = newPaperIds[i : i + SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                query.prepare(
+                    f"""
+                SELECT PaperTags.paperId, Tags.name
+                FROM PaperTags JOIN Tags ON PaperTags.tagId=Tags.id
+                WHERE PaperTags.paperId IN ({placeholders})
+                """
+                )
+                for paperId in chunk:
+                    query.addBindValue(paperId)
+                query.exec()
+                while query.next():
+                    self.index.add_tag(query.value(0), query.value(1))
+                    size += TAG_MEMBERSHIP_BYTES
+            query.finish()
+            # Tagged before the path was added while the directory was evicted
+            for paperId, tag in pendingTags:
+                if self.index.add_tag(paperId, tag):
+                    self.tag_writes.add(paperId, tag)
+            evicted = self.loaded_dirs.add(directory_path, paths, size)
+            for path in evicted:
+                self.index.evict_path(path)
+            if evicted:
+                self._evict_flush = self.tag_writes.flush()
 
-    def load_paper_tags(self):
-        query = QSqlQuery(self.db)
-        query.exec(
+    def get_tag_cache_stats(self) -> TagCacheStats:
+        """Get hits, misses, evictions and memory use of the lazy tag cache"""
+        return dataclasses.replace(self.loaded_dirs.stats)
+
+    def get_paper_tags(self, paper_path: str) -> tuple:
+        """Get the sorted names of tags of the paper at the path"""
+        self.load_dir(posixpath.dirname(paper_path))
+        return self.index.tags_of(paper_path)
+
+    def get_tags_of_paper(self, paperId: int) -> tuple:
+        """Get the sorted names of tags of the paper"""
+        with self.cache_lock:
+            return self.index.names_of(paperId)
+
+    def get_papers_page(self, after: typing.Optional[tuple], limit: int) -> list:
+        """Get a page of the tagged papers on this device, ordered by name
+
+        Args:
+            after (typing.Optional[tuple]): (name, paperId) of the last paper
+                of the previous page, or None for the first page
+            limit (int): maximum number of papers
+
+        Returns:
+            list: list of (paperId, name)
+        """
+        name, paperId = after if after is not None else ("", -1)
+        query = QSqlQuery(self.connection())
+        query.prepare(
             """
-        SELECT DISTINCT PaperPaths.paperId, PaperPaths.path, Tags.name
-        FROM PaperPaths, PaperTags, Tags
-        WHERE PaperPaths.paperId=PaperTags.paperId AND PaperTags.tagId=Tags.id
+        SELECT Papers.id, Papers.name FROM Papers
+        WHERE (Papers.name, Papers.id) > (?, ?)
+            AND EXISTS (SELECT 1 FROM PaperTags WHERE paperId=Papers.id)
+            AND EXISTS (
+                SELECT 1 FROM PaperPaths
+                WHERE paperId=Papers.id AND deviceMacAddr=?
+            )
+        ORDER BY Papers.name, Papers.id LIMIT ?
         """
         )
+        for value in (name, paperId, hex(getMacAddr()), limit):
+            query.addBindValue(value)
         query.exec()
-        paperId, paper_path, tag_name = range(3)
+        papers = []
         while query.next():
-            i, p, n = (
-                query.value(paperId),
-                query.value(paper_path),
-                query.value(tag_name),
-            )
-            if p not in self.paperTags:
-                self.paperTags[p] = []
-            self.paperTags[p].append(n)
-            if i not in self.papers:
-                self.papers[i] = set()
-            self.papers[i].add(p)
-
-    def get_paper_tags(self, paper_path: str):
-        tags = self.paperTags.get(paper_path, [])
-        return list(sorted(tags))
-
-    def set_paper_tags(self, paper_path: str, tags: list):
-        if paper_path not in self.paperTags:
-            self.paperTags[paper_path] = list()
-        self.paperTags[paper_path].extend(tags)
-        self.paperTags[paper_path] = list(set(self.paperTags[paper_path]))
-        # same paper may have duplicates in other locations
-        for papper_id, paths in self.papers.items():
-            if paper_path in paths:
-                for path in paths:
-                    if path == paper_path:
-                        continue
-                    if path not in self.paperTags:
-                        self.paperTags[path] = list()
-                    self.paperTags[path].extend(tags)
-                    self.paperTags[path] = list(set(self.paperTags[path]))
-
-    def remove_paper_tags(self, paper_path: str, tag: str):
-        if paper_path not in self.paperTags:
-            return
-        self.paperTags[paper_path].remove(tag)
-        query = QSqlQuery(self.db)
+            papers.append((query.value(0), query.value(1)))
+        query.finish()
+        return papers
+
+    def get_paper_name(self, paperId: int) -> typing.Optional[str]:
+        """Get the name of the paper, if it has a location on this device"""
+        query = QSqlQuery(self.connection())
         query.prepare(
             """
-        DELETE FROM PaperTags
-        WHERE paperId=(SELECT DISTINCT paperId FROM PaperPaths WHERE path=?)
-        AND tagId=(SELECT id FROM Tags WHERE name=?);
+        SELECT name FROM Papers WHERE id=? AND EXISTS (
+            SELECT 1 FROM PaperPaths WHERE paperId=Papers.id AND deviceMacAddr=?
+        )
         """
         )
-        query.addBindValue(paper_path)
-        query.addBindValue(tag)
+        query.addBindValue(paperId)
+        query.addBindValue(hex(getMacAddr()))
         query.exec()
+        name = query.value(0) if query.next() else None
+        query.finish()
+        return name
+
+    def get_paper_files(self, paperIds: typing.Optional[list] = None) -> list:
+        """Get the location on this device of tagged papers, ordered by name
 
-    def update_paper_tags(self):
-        # Write cache into the database
-        query = QSqlQuery(self.db)
-        for paper_path, tags in self.paperTags.items():
+        Args:
+            paperIds (typing.Optional[list], optional): papers, or None for
+                all tagged papers. Defaults to None.
+
+        Returns:
+            list: list of (name, path, prehash)
+        """
+        with self.cache_lock:
+            tagged = 0
+            for name in self.index.used_tag_names():
+                tagged |= self.index.papers_with(name)
+        ids = bitmap_ids(tagged)
+        if paperIds is not None:
+            ids = sorted(set(ids).intersection(paperIds))
+        deviceMacAddr = hex(getMacAddr())
+        papers = []
+        query = QSqlQuery(self.connection())
+        for i in range(0, len(ids), SQLITE_MAX_PARAMS):
+            chunk = ids[i : i + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
             query.prepare(
-                """
-            SELECT DISTINCT paperId FROM PaperPaths WHERE path=? 
+                f"""
+            SELECT Papers.name, Papers.id, MIN(PaperPaths.path), Papers.prehash
+            FROM Papers JOIN PaperPaths ON PaperPaths.paperId=Papers.id
+            WHERE PaperPaths.deviceMacAddr=? AND Papers.id IN ({placeholders})
+            GROUP BY Papers.id
             """
             )
-            query.addBindValue(paper_path)
-            query.exec()
-            if query.next():
-                paperId = query.value(0)
-            else:
-                continue
-            for tag in tags:
-                query.prepare(
-                    """
-                INSERT INTO Tags(name) VALUES (?)
-                """
-                )
-                query.addBindValue(tag)
-                query.exec()
-                tagId = query.lastInsertId()
-                # Tag already in database
-                if tagId is None:
-                    query.prepare("SELECT id FROM Tags WHERE name=?")
-                    query.addBindValue(tag)
-                    query.exec()
-                    query.next()
-                    tagId = query.value(0)
-                query.prepare(
-                    """
-                INSERT INTO PaperTags(paperId,tagId) VALUES (?,?)
-                """
-                )
+            query.addBindValue(deviceMacAddr)
+            for paperId in chunk:
                 query.addBindValue(paperId)
-                query.addBindValue(tagId)
-                query.exec()
+            query.exec()
+            while query.next():
+                papers.append(tuple(query.value(i) for i in range(4)))
         query.finish()
+        papers.sort()
+        return [(name, path, prehash or None) for name, _, path, prehash in papers]
+
+    def get_prehashes(self, paths: list) -> dict:
+        """Get the prefilter hash of the pdfs at the paths, if scanned
+
+        Returns:
+            dict: path to prehash
+        """
+        papers = self._get_path_papers(paths, hex(getMacAddr()))
+        return {path: prehash for path, (_, prehash) in papers.items() if prehash}
+
+    def get_tag_counts(self) -> dict:
+        """Get the number of papers with each tag in use"""
+        with self.cache_lock:
+            return self.index.tag_counts_by_name()
+
+    def check_tag_counts(self, rebuild=True) -> dict:
+        """Compare the tag counts kept in memory with database
+
+        Pending tag changes are written first. Counts are maintained as tags
+        are added and removed; rebuilding recounts the papers in each tag's
+        bitmap from scratch.
+
+        Args:
+            rebuild (bool, optional): recount before comparing. Defaults to True.
+
+        Returns:
+            dict: tag name to (count in memory, count in database), for tags
+                whose counts differ
+        """
+        self.tag_writes.flush().result()
+        query = QSqlQuery(self.connection())
+        query.exec(
+            """
+        SELECT Tags.name, count(*) FROM Tags
+        JOIN PaperTags ON Tags.id=PaperTags.tagId GROUP BY Tags.id
+        """
+        )
+        stored = {}
+        while query.next():
+            stored[query.value(0)] = query.value(1)
+        query.finish()
+        with self.cache_lock:
+            if rebuild:
+                self.index.recount()
+            counts = self.index.tag_counts_by_name()
+        return {
+            name: (counts.get(name, 0), stored.get(name, 0))
+            for name in counts.keys() | stored.keys()
+            if counts.get(name, 0) != stored.get(name, 0)
+        }
+
+    def query_papers(self, expression: str) -> list:
+        """Get the papers matching a boolean tag query
+
+        The query is evaluated on the in-memory bitmaps of papers per tag, see
+        `tagquery.parse` for the syntax.
+
+        Args:
+            expression (str): e.g. "ml AND (survey OR review) AND NOT read"
+
+        Raises:
+            TagQueryError: if the query is invalid
+
+        Returns:
+            list: sorted paperIds
+        """
+        node = tagquery.parse(expression)
+        with self.cache_lock:
+            universe = self.index.library_papers()
+            bits = tagquery.evaluate(node, self.index.papers_with, universe)
+        return bitmap_ids(bits)
+
+    def get_paper_id(self, paper_path: str) -> typing.Optional[int]:
+        self.load_dir(posixpath.dirname(paper_path))
+        return self.index.paper_of(paper_path)
+
+    def set_paper_tags(self, paper_path: str, tags: list) -> list:
+        """Add tags to the paper at the path, and so to all its locations
+
+        Returns:
+            list: names of tags the paper did not have, whose counts increased
+        """
+        self.load_dir(posixpath.dirname(paper_path))
+        added = []
+        with self.cache_lock:
+            paperId = self.index.paper_of(paper_path)
+            for tag in tags:
+                if paperId is None:
+                    # Written once the path is added to database
+                    self.index.add_pending_tag(paper_path, tag)
+                elif self.index.add_tag(paperId, tag):
+                    added.append(tag)
+        for tag in added:
+            self.tag_writes.add(paperId, tag)
+        return added
+
+    def remove_paper_tags(self, paper_path: str, tag: str) -> bool:
+        """Remove a tag from the paper at the path
+
+        Returns:
+            bool: True if the paper had the tag, whose count decreased
+        """
+        self.load_dir(posixpath.dirname(paper_path))
+        with self.cache_lock:
+            paperId = self.index.paper_of(paper_path)
+            if paperId is None:
+                self.index.remove_pending_tag(paper_path, tag)
+                return False
+            removed = self.index.remove_tag(paperId, tag)
+        if removed:
+            self.tag_writes.remove(paperId, tag)
+        return removed
+
+    def update_paper_tags(self) -> Future:
+        """Write tags added or removed since last time to database now
+
+        Returns:
+            Future: set once the changes are committed
+        """
+        return self.tag_writes.flush()
 
     def get_setting(self, key: Settings):
         """Get the value of setting from database"""
 
         assert isinstance(key, Settings)
-        query = QSqlQuery(self.db)
+        query = QSqlQuery(self.connection())
         query.prepare(
             """
         SELECT value FROM Settings WHERE key=?
@@ -204,7 +577,10 @@ class PMDatabase:
         """Set the value of setting from database"""
 
         assert isinstance(key, Settings)
-        query = QSqlQuery(self.db)
+        self.writer.submit(lambda db: self._write_setting(db, key, value))
+
+    def _write_setting(self, db: QSqlDatabase, key: Settings, value: str):
+        query = QSqlQuery(db)
         query.prepare(
             """
         INSERT OR REPLACE INTO Settings(key,value) VALUES(?,?)
@@ -212,41 +588,699 @@ class PMDatabase:
         )
         query.addBindValue(key.value)
         query.addBindValue(value)
+        checked_exec(query)
+        query.finish()
+
+    def get_unindexed_texts(self) -> list:
+        """Get the papers on this device whose text is not yet indexed
+
+        A paper is skipped if its text was extracted from another of its
+        locations, or from this location at the same size and mtime.
+
+        Returns:
+            list: list of (path, paperId, size, mtime), one per paper
+        """
+        query = QSqlQuery(self.connection())
+        query.prepare(
+            """
+        SELECT PaperPaths.path, PaperPaths.paperId, ScanFiles.size, ScanFiles.mtime
+        FROM PaperPaths JOIN ScanFiles ON ScanFiles.path=PaperPaths.path
+        WHERE PaperPaths.deviceMacAddr=? AND NOT EXISTS (
+            SELECT 1 FROM TextIndexed
+            WHERE TextIndexed.paperId=PaperPaths.paperId AND (
+                TextIndexed.path!=PaperPaths.path
+                OR (TextIndexed.size=ScanFiles.size
+                    AND TextIndexed.mtime=ScanFiles.mtime)
+            )
+        )
+        ORDER BY PaperPaths.path
+        """
+        )
+        query.addBindValue(hex(getMacAddr()))
+        query.exec()
+        papers = {}
+        while query.next():
+            paperId = query.value(1)
+            if paperId not in papers:
+                path, size, mtime = query.value(0), query.value(2), query.value(3)
+                papers[paperId] = (path, paperId, size, mtime)
+        query.finish()
+        return list(papers.values())
+
+    def set_page_texts(self, item: tuple, pages: typing.Optional[list]) -> Future:
+        """Replace the indexed text of a paper
+
+        Args:
+            item (tuple): (path, paperId, size, mtime) of the pdf extracted
+            pages (typing.Optional[list]): text per page, or None if the pdf
+                cannot be read, which is not retried until it changes
+
+        Returns:
+            Future: set once written
+        """
+        return self.writer.submit(lambda db: self._write_page_texts(db, item, pages))
+
+    @staticmethod
+    def _write_page_texts(db: QSqlDatabase, item: tuple, pages: list) -> None:
+        path, paperId, size, mtime = item
+        pages = pages or []
+        query = QSqlQuery(db)
+        query.prepare("DELETE FROM PageTexts WHERE paperId=?")
+        query.addBindValue(paperId)
+        checked_exec(query)
+        numbers = [i + 1 for i, text in enumerate(pages) if text.strip()]
+        if numbers:
+            query.prepare("INSERT INTO PageTexts(paperId,page,text) VALUES (?,?,?)")
+            query.addBindValue([paperId] * len(numbers))
+            query.addBindValue(numbers)
+            query.addBindValue([pages[i - 1] for i in numbers])
+            checked_exec_batch(query)
+        query.prepare(
+            """
+        INSERT OR REPLACE INTO TextIndexed(paperId,path,size,mtime,pages)
+        VALUES (?,?,?,?,?)
+        """
+        )
+        for value in (paperId, path, size, mtime, len(pages)):
+            query.addBindValue(value)
+        checked_exec(query)
+        query.finish()
+
+    def search_text(self, text: str, limit=200) -> list:
+        """Search the text of papers
+
+        Args:
+            text (str): FTS5 query, or words to find if it is not valid syntax
+            limit (int, optional): maximum number of pages. Defaults to 200.
+
+        Returns:
+            list: list of TextHit, best matches first
+        """
+        if not text.strip():
+            return []
+        query = QSqlQuery(self.connection())
+        # Invalid syntax, e.g. an unbalanced quote, is searched as plain words
+        words = " ".join(f'"{word}"' for word in text.replace('"', " ").split())
+        for match in (text, words):
+            query.prepare(
+                """
+            SELECT PageTexts.paperId,
+                (SELECT MIN(path) FROM PaperPaths
+                WHERE paperId=PageTexts.paperId AND deviceMacAddr=?),
+                Papers.name, PageTexts.page,
+                snippet(PageTextsSearch, 0, '[', ']', '...', 12)
+            FROM PageTextsSearch
+            JOIN PageTexts ON PageTexts.id=PageTextsSearch.rowid
+            JOIN Papers ON Papers.id=PageTexts.paperId
+            WHERE PageTextsSearch MATCH ?
+            ORDER BY rank LIMIT ?
+            """
+            )
+            query.addBindValue(hex(getMacAddr()))
+            query.addBindValue(match)
+            query.addBindValue(limit)
+            if query.exec():
+                break
+        hits = []
+        while query.next():
+            # Papers not on this device cannot be opened
+            if query.value(1):
+                hits.append(TextHit(*(query.value(i) for i in range(5))))
+        query.finish()
+        return hits
+
+    def update_dir(self, directory_path: str) -> "IngestStats":
+        """Add all pdfs in the given directory to database
+
+        A persisted scan manifest records the mtime of every scanned directory
+        and the size and mtime of every pdf. Only directories whose mtime has
+        changed since the last scan are listed again, and only new, modified or
+        deleted pdfs in them are written to database. Changes are written in
+        batches, each in a single transaction.
+
+        Args:
+            directory_path (str): directory
+
+        Returns:
+            IngestStats: pdfs added or removed and time taken
+        """
+        return self.update_dirs([Path(directory_path).resolve().as_posix()])
+
+    def update_dirs(self, directory_paths: list) -> "IngestStats":
+        """Rescan the given resolved directories, see `update_dir`
+
+        Args:
+            directory_paths (list): resolved posix paths of directories
+
+        Returns:
+            IngestStats: pdfs added or removed and time taken
+        """
+        start = time.perf_counter()
+        stats = IngestStats()
+        batch = ScanBatch()
+        failed = False
+        roots = []
+        for path in sorted(set(directory_paths)):
+            # Skip directories under another one to be scanned
+            if not roots or not path.startswith(roots[-1] + "/"):
+                roots.append(path)
+        for root_dir in roots:
+            manifest = self._load_dir_manifest(root_dir)
+            stack = [root_dir]
+            while stack:
+                path = stack.pop()
+                if isinstance(path, tuple):
+                    # Row of a directory whose subdirectories are all scanned.
+                    # It is written after them, so a scan interrupted or
+                    # failed before lists the directory again next time.
+                    path, parent, mtime, entryCount = path
+                    mtime = -1 if failed else mtime
+                    batch.dirs.append((path, parent, mtime, entryCount))
+                    continue
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                stats.dirs += 1
+                known = manifest.get(path)
+                # Unchanged directory, its subdirectories are known from manifest
+                if known is not None and known.mtime == mtime:
+                    stack.extend(known.children)
+                    continue
+                if known is None:
+                    stats.new_dirs.append(path)
+                row, subdirs = self._scan_dir(path, mtime, known, batch)
+                if row is not None:
+                    stack.append(row)
+                stack.extend(subdirs)
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    failed |= not self._write_scan_batch(batch, stats)
+                    batch = ScanBatch()
+        if len(batch):
+            self._write_scan_batch(batch, stats)
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    def _scan_dir(
+        self,
+        path: str,
+        mtime: int,
+        known: typing.Optional["DirManifest"],
+        batch: "ScanBatch",
+    ) -> tuple:
+        """List a changed directory and record the differences in batch
+
+        Returns:
+            tuple: row of the directory in ScanDirs, None if it cannot be
+                listed, and paths of its subdirectories
+        """
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return None, []
+        subdirs, pdfs = [], {}
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(f"{path}/{entry.name}")
+                elif entry.name.lower().endswith(".pdf") and entry.is_file():
+                    st = entry.stat()
+                    pdfs[entry.name] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+        known_files = self._load_file_manifest(path) if known is not None else {}
+        for name, (size, file_mtime) in pdfs.items():
+            if known_files.get(name) != (size, file_mtime):
+                batch.files.append((f"{path}/{name}", path, name, size, file_mtime))
+        for name in known_files.keys() - pdfs.keys():
+            batch.removed_files.append(f"{path}/{name}")
+        if known is not None:
+            batch.removed_dirs.extend(set(known.children).difference(subdirs))
+        return (path, posixpath.dirname(path), mtime, len(entries)), subdirs
+
+    def _load_dir_manifest(self, root_dir: str) -> dict:
+        """Load the scan manifest of the root directory and its subdirectories
+
+        Returns:
+            dict: directory path to DirManifest
+        """
+        manifest = {}
+        query = QSqlQuery(self.connection())
+        query.prepare(
+            """
+        SELECT path, parent, mtime FROM ScanDirs
+        WHERE path=? OR (path>=? AND path<?)
+        """
+        )
+        query.addBindValue(root_dir)
+        query.addBindValue(root_dir + "/")
+        query.addBindValue(root_dir + "0")  # "0" follows "/"
         query.exec()
+        parents = []
+        while query.next():
+            path = query.value(0)
+            manifest[path] = DirManifest(int(query.value(2)))
+            parents.append((path, query.value(1)))
         query.finish()
+        for path, parent in parents:
+            if parent in manifest:
+                manifest[parent].children.append(path)
+        return manifest
+
+    def get_scanned_dirs(self, root_dir: str) -> list:
+        """Get the root directory and its subdirectories in the scan manifest"""
+
+        return list(self._load_dir_manifest(root_dir))
+
+    def _load_file_manifest(self, directory_path: str) -> dict:
+        """Load size and mtime of pdfs previously seen in the directory
+
+        Returns:
+            dict: file name to (size, mtime)
+        """
+        files = {}
+        query = QSqlQuery(self.connection())
+        query.prepare("SELECT path, size, mtime FROM ScanFiles WHERE dir=?")
+        query.addBindValue(directory_path)
+        query.exec()
+        while query.next():
+            name = query.value(0)[len(directory_path) + 1 :]
+            files[name] = (int(query.value(1)), int(query.value(2)))
+        query.finish()
+        return files
+
+    def _prepare_scan_queries(self, db: QSqlDatabase) -> dict:
+        """Prepare the statements used to write scan results"""
+
+        statements = {
+            "insertPaper": "INSERT INTO Papers(name,prehash,digest) VALUES(?,?,?)",
+            "insertPath": """
+            INSERT OR IGNORE INTO PaperPaths(paperId,path,deviceMacAddr)
+            VALUES(?,?,?)
+            """,
+            "deletePath": "DELETE FROM PaperPaths WHERE path=? AND deviceMacAddr=?",
+            "upsertFile": """
+            INSERT OR REPLACE INTO ScanFiles(path,dir,size,mtime) VALUES(?,?,?,?)
+            """,
+            "deleteFile": "DELETE FROM ScanFiles WHERE path=?",
+            "upsertDir": """
+            INSERT OR REPLACE INTO ScanDirs(path,parent,mtime,entryCount,lastScan)
+            VALUES(?,?,?,?,?)
+            """,
+        }
+        queries = {}
+        for key, statement in statements.items():
+            queries[key] = QSqlQuery(db)
+            queries[key].prepare(statement)
+        return queries
+
+    def _write_scan_batch(self, batch: "ScanBatch", stats: "IngestStats") -> bool:
+        """Write the changes found by scanning in a single transaction
+
+        Returns:
+            bool: True if written, False if rolled back
+        """
 
-    def update_dir(self, directory_path: str):
         deviceMacAddr = hex(getMacAddr())
-        for root, dirs, files in os.walk(directory_path):
-            query = QSqlQuery(self.db)
-            for file in files:
-                if not file.lower().endswith(".pdf"):
+        # Hash and identify pdfs before queueing the writes
+        files, unreadableDirs = self._hash_files(batch.files)
+        resolved, newPapers, updatedPapers = self._resolve_papers(
+            files, deviceMacAddr
+        )
+        future = self.writer.submit(
+            lambda db: self._apply_scan_batch(
+                db,
+                batch,
+                files,
+                resolved,
+                newPapers,
+                updatedPapers,
+                unreadableDirs,
+                deviceMacAddr,
+            )
+        )
+        try:
+            future.result()
+        except Exception as e:
+            # Rolled back, so its directories are scanned again next time
+            stats.errors.append(str(e))
+            return False
+        with self.cache_lock:
+            self._forget_paths(batch.removed_files)
+            self._attach_paths(
+                [(paper.id, path, prevId) for path, paper, prevId in resolved]
+            )
+        stats.added.extend(f[0] for f in files)
+        stats.removed.extend(batch.removed_files)
+        stats.removed_dirs.extend(batch.removed_dirs)
+        return True
+
+    def _apply_scan_batch(
+        self,
+        db: QSqlDatabase,
+        batch: "ScanBatch",
+        files: list,
+        resolved: list,
+        newPapers: list,
+        updatedPapers: list,
+        unreadableDirs: set,
+        deviceMacAddr: str,
+    ) -> None:
+        """Write operation of the changes found by scanning, see _write_scan_batch"""
+
+        queries = self._prepare_scan_queries(db)
+        for path in batch.removed_dirs:
+            batch.removed_files.extend(
+                self._delete_dir_tree(db, path, deviceMacAddr)
+            )
+        if batch.removed_files:
+            n = len(batch.removed_files)
+            queries["deletePath"].addBindValue(batch.removed_files)
+            queries["deletePath"].addBindValue([deviceMacAddr] * n)
+            checked_exec_batch(queries["deletePath"])
+            queries["deleteFile"].addBindValue(batch.removed_files)
+            checked_exec_batch(queries["deleteFile"])
+        if files:
+            paths, dirs, names, sizes, mtimes, _ = map(list, zip(*files))
+            for paper in newPapers:
+                queries["insertPaper"].addBindValue(paper.name)
+                queries["insertPaper"].addBindValue(paper.prehash)
+                queries["insertPaper"].addBindValue(paper.digest)
+                checked_exec(queries["insertPaper"])
+                paper.id = queries["insertPaper"].lastInsertId()
+            self._update_paper_identities(db, updatedPapers)
+            # Pdfs changed in place or found in a paper previously known by name
+            for path, paper, prevId in resolved:
+                if prevId is not None and prevId != paper.id:
+                    self._move_path(db, path, prevId, paper.id, deviceMacAddr)
+            queries["insertPath"].addBindValue([paper.id for _, paper, _ in resolved])
+            queries["insertPath"].addBindValue(paths)
+            queries["insertPath"].addBindValue([deviceMacAddr] * len(paths))
+            checked_exec_batch(queries["insertPath"])
+            queries["upsertFile"].addBindValue(paths)
+            queries["upsertFile"].addBindValue(dirs)
+            queries["upsertFile"].addBindValue(sizes)
+            queries["upsertFile"].addBindValue(mtimes)
+            checked_exec_batch(queries["upsertFile"])
+        if batch.dirs:
+            dirPaths, parents, dirMtimes, entryCounts = map(list, zip(*batch.dirs))
+            # Directories with unreadable pdfs are listed again on next scan
+            for i, path in enumerate(dirPaths):
+                if path in unreadableDirs:
+                    dirMtimes[i] = -1
+            queries["upsertDir"].addBindValue(dirPaths)
+            queries["upsertDir"].addBindValue(parents)
+            queries["upsertDir"].addBindValue(dirMtimes)
+            queries["upsertDir"].addBindValue(entryCounts)
+            queries["upsertDir"].addBindValue([time.time()] * len(dirPaths))
+            checked_exec_batch(queries["upsertDir"])
+        for query in queries.values():
+            query.finish()
+
+    def _delete_dir_tree(
+        self, db: QSqlDatabase, directory_path: str, deviceMacAddr: str
+    ) -> list:
+        """Delete a removed directory and everything under it from database
+
+        Returns:
+            list: paths of pdfs that were in the directory
+        """
+        lo, hi = directory_path + "/", directory_path + "0"  # "0" follows "/"
+        query = QSqlQuery(db)
+        query.prepare("SELECT path FROM ScanFiles WHERE path>=? AND path<?")
+        query.addBindValue(lo)
+        query.addBindValue(hi)
+        checked_exec(query)
+        removed = []
+        while query.next():
+            removed.append(query.value(0))
+        query.prepare("DELETE FROM ScanDirs WHERE path=? OR (path>=? AND path<?)")
+        query.addBindValue(directory_path)
+        query.addBindValue(lo)
+        query.addBindValue(hi)
+        checked_exec(query)
+        query.prepare("DELETE FROM ScanFiles WHERE path>=? AND path<?")
+        query.addBindValue(lo)
+        query.addBindValue(hi)
+        checked_exec(query)
+        query.prepare(
+            "DELETE FROM PaperPaths WHERE path>=? AND path<? AND deviceMacAddr=?"
+        )
+        query.addBindValue(lo)
+        query.addBindValue(hi)
+        query.addBindValue(deviceMacAddr)
+        checked_exec(query)
+        query.finish()
+        return removed
+
+    def _attach_paths(self, newPaths: list) -> None:
+        """Record new locations of papers in cache
+
+        Args:
+            newPaths (list): list of (paperId, path, previous paperId or None)
+        """
+        for paperId, path, prevId in newPaths:
+            directory = posixpath.dirname(path)
+            if self.lazy:
+                if directory not in self.loaded_dirs:
+                    # Loaded from database with the directory later
+                    self.index.mark_paper(paperId)
+                    if prevId is not None and prevId != paperId:
+                        self.index.copy_tag_bits(prevId, paperId)
                     continue
-                query.prepare(
-                    """
-                INSERT INTO Papers(name) VALUES(?)
-                """
+                self.loaded_dirs.add_path(directory, path)
+            # A path moved to another paper keeps its tags, see _move_path
+            if prevId is not None and prevId != paperId:
+                self.index.copy_tags(prevId, paperId)
+            for tag in self.index.add_path(paperId, path):
+                if self.index.add_tag(paperId, tag):
+                    self.tag_writes.add(paperId, tag)
+
+    def _forget_paths(self, paths: list) -> None:
+        """Remove paths of deleted pdfs from cache"""
+
+        for path in paths:
+            self.index.remove_path(path)
+
+    def _hash_files(self, files: list) -> tuple:
+        """Compute the prefilter hash of new or modified pdfs
+
+        Pdfs that cannot be read are left out.
+
+        Args:
+            files (list): (path, dir, name, size, mtime)
+
+        Returns:
+            tuple: list of (path, dir, name, size, mtime, prehash), and set of
+                directories with pdfs that cannot be read
+        """
+        prehashes = hashing.prefilter_hashes([f[0] for f in files])
+        hashed, unreadableDirs = [], set()
+        for f, h in zip(files, prehashes):
+            if h is None:
+                unreadableDirs.add(f[1])
+            else:
+                hashed.append(f + (h,))
+        return hashed, unreadableDirs
+
+    def _resolve_papers(self, files: list, deviceMacAddr: str) -> tuple:
+        """Find or create the paper of each pdf by its content
+
+        Pdfs are matched by prefilter hash. Only where the prefilter hash
+        collides, with a known paper or another pdf in the batch, full digests
+        are computed, in parallel, to tell apart different papers.
+
+        Args:
+            files (list): (path, dir, name, size, mtime, prehash)
+            deviceMacAddr (str): device
+
+        Returns:
+            tuple: list of (path, PaperIdentity, previous paperId of the path),
+                list of new PaperIdentity to insert, and list of existing
+                PaperIdentity whose hashes are to be updated
+        """
+        if not files:
+            return [], [], []
+        paths = [f[0] for f in files]
+        prehashes = [f[5] for f in files]
+        current = self._get_path_papers(paths, deviceMacAddr)
+        known = self._get_papers_by_prehash(list(set(prehashes)))
+        counts = Counter(prehashes)
+        colliding = {h for h in prehashes if counts[h] > 1 or h in known}
+        # Known papers without digest are hashed from one of their other paths
+        batchPaths = set(paths)
+        knownPaths = {}
+        for h in colliding:
+            for paper in known.get(h, []):
+                if paper.digest is None:
+                    path = self._get_other_path(paper.id, batchPaths, deviceMacAddr)
+                    if path is not None:
+                        knownPaths[path] = paper
+        toDigest = [p for p, h in zip(paths, prehashes) if h in colliding]
+        digests = hashing.full_digests(toDigest + list(knownPaths))
+        updatedPapers = []
+        for path, paper in knownPaths.items():
+            if digests[path] is not None:
+                paper.digest = digests[path]
+                updatedPapers.append(paper)
+        resolved, newPapers, adopted = [], [], set()
+        for (path, _, name, _, _, prehash), digest in zip(
+            files, (digests.get(p) for p in paths)
+        ):
+            paper = None
+            if prehash in colliding and digest is not None:
+                for candidate in known.get(prehash, []):
+                    if candidate.digest == digest:
+                        paper = candidate
+                        break
+            if paper is None and prehash in colliding:
+                paper = self._moved_paper(known.get(prehash, []), adopted)
+                if paper is not None:
+                    # Store its digest, to tell apart later copies
+                    adopted.add(paper.id)
+                    paper.digest = digest
+                    updatedPapers.append(paper)
+            prevId, prevPrehash = current.get(path, (None, None))
+            if paper is None and prevId is not None and prevPrehash is None:
+                # Adopt the paper previously identified by name only
+                if prevId not in adopted:
+                    adopted.add(prevId)
+                    paper = PaperIdentity(prevId, name, prehash, digest)
+                    updatedPapers.append(paper)
+            if paper is None:
+                paper = PaperIdentity(None, name, prehash, digest)
+                newPapers.append(paper)
+            if paper.id is None or paper.id in adopted:
+                known.setdefault(prehash, []).append(paper)
+            resolved.append((path, paper, prevId))
+        return resolved, newPapers, updatedPapers
+
+    @staticmethod
+    def _moved_paper(candidates: list, adopted: set) -> typing.Optional[PaperIdentity]:
+        """The paper of a pdf moved or renamed, if it is the only candidate
+
+        A known paper still without digest after `_resolve_papers` has no
+        other path to hash, its pdf is gone. If it is the only known paper
+        with the prefilter hash, the pdf is taken as moved to the new path.
+        """
+        known = [paper for paper in candidates if paper.id is not None]
+        if len(known) == 1 and known[0].digest is None:
+            if known[0].id not in adopted:
+                return known[0]
+        return None
+
+    def _get_path_papers(self, paths: list, deviceMacAddr: str) -> dict:
+        """Look up the papers currently at the paths, in chunks
+
+        Returns:
+            dict: path to (paperId, prehash)
+        """
+        papers = {}
+        query = QSqlQuery(self.connection())
+        for i in range(0, len(paths), SQLITE_MAX_PARAMS):
+            chunk = paths[i : i + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            query.prepare(
+                f"""
+            SELECT PaperPaths.path, Papers.id, Papers.prehash
+            FROM PaperPaths JOIN Papers ON Papers.id=PaperPaths.paperId
+            WHERE PaperPaths.deviceMacAddr=? AND PaperPaths.path IN ({placeholders})
+            """
+            )
+            query.addBindValue(deviceMacAddr)
+            for path in chunk:
+                query.addBindValue(path)
+            query.exec()
+            while query.next():
+                papers[query.value(0)] = (query.value(1), query.value(2) or None)
+        query.finish()
+        return papers
+
+    def _get_papers_by_prehash(self, prehashes: list) -> dict:
+        """Look up known papers by prefilter hash, in chunks
+
+        Returns:
+            dict: prehash to list of PaperIdentity
+        """
+        papers = {}
+        query = QSqlQuery(self.connection())
+        for i in range(0, len(prehashes), SQLITE_MAX_PARAMS):
+            chunk = prehashes[i : i + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            query.prepare(
+                f"""
+            SELECT id, name, prehash, digest FROM Papers
+            WHERE prehash IN ({placeholders})
+            """
+            )
+            for prehash in chunk:
+                query.addBindValue(prehash)
+            query.exec()
+            while query.next():
+                paper = PaperIdentity(
+                    query.value(0),
+                    query.value(1),
+                    query.value(2),
+                    query.value(3) or None,
                 )
-                query.addBindValue(file)
-                query.exec()
-                paperId = query.lastInsertId()
-                # Paper name already in databse
-                if paperId is None:
-                    query.prepare("SELECT id FROM Papers WHERE name=?")
-                    query.addBindValue(file)
-                    query.exec()
-                    query.next()
-                    paperId = query.value(0)
-                if paperId:
-                    pdf_path = Path(os.path.join(root, file)).resolve().as_posix()
-                    query = QSqlQuery(self.db)
-                    query.prepare(
-                        """
-                    INSERT INTO PaperPaths(paperId,path,deviceMacAddr) 
-                    VALUES(?,?,?)
-                    """
-                    )
-                    query.addBindValue(paperId)
-                    query.addBindValue(pdf_path)
-                    query.addBindValue(deviceMacAddr)
-                    query.exec()
+                papers.setdefault(paper.prehash, []).append(paper)
+        query.finish()
+        return papers
+
+    def _get_other_path(
+        self, paperId: int, excluded: set, deviceMacAddr: str
+    ) -> typing.Optional[str]:
+        """Get an existing path of the paper that is not being rescanned"""
+
+        query = QSqlQuery(self.connection())
+        query.prepare("SELECT path FROM PaperPaths WHERE paperId=? AND deviceMacAddr=?")
+        query.addBindValue(paperId)
+        query.addBindValue(deviceMacAddr)
+        query.exec()
+        result = None
+        while query.next():
+            path = query.value(0)
+            if path not in excluded and os.path.isfile(path):
+                result = path
+                break
+        query.finish()
+        return result
+
+    def _update_paper_identities(self, db: QSqlDatabase, papers: list) -> None:
+        """Store the hashes of existing papers"""
+
+        query = QSqlQuery(db)
+        query.prepare("UPDATE Papers SET prehash=?, digest=? WHERE id=?")
+        for paper in papers:
+            query.addBindValue(paper.prehash)
+            query.addBindValue(paper.digest)
+            query.addBindValue(paper.id)
+            checked_exec(query)
+        query.finish()
+
+    def _move_path(
+        self,
+        db: QSqlDatabase,
+        path: str,
+        prevId: int,
+        paperId: int,
+        deviceMacAddr: str,
+    ) -> None:
+        """Point a path to another paper, which also gets the previous tags"""
+
+        query = QSqlQuery(db)
+        query.prepare("DELETE FROM PaperPaths WHERE path=? AND deviceMacAddr=?")
+        query.addBindValue(path)
+        query.addBindValue(deviceMacAddr)
+        checked_exec(query)
+        query.prepare(
+            """
+        INSERT OR IGNORE INTO PaperTags(paperId,tagId)
+        SELECT ?, tagId FROM PaperTags WHERE paperId=?
+        """
+        )
+        query.addBindValue(paperId)
+        query.addBindValue(prevId)
+        checked_exec(query)
+        query.finish()
@@ -1,35 +1,211 @@
-from PyQt6.QtWidgets import QDockWidget, QTreeView
-from PyQt6.QtSql import QSqlQueryModel
-from PyQt6.QtCore import Qt
-from uuid import getnode as getMacAddr
+import bisect
+
+from PyQt6.QtWidgets import QDockWidget, QTreeView, QLineEdit, QVBoxLayout, QWidget
+from PyQt6.QtCore import (
+    Qt,
+    QAbstractTableModel,
+    QSortFilterProxyModel,
+    QModelIndex,
+)
+
+from ..database import PMDatabase
+from ..signals import PMCommunicate
+from ..tagquery import TagQueryError
+
+# Number of papers read from database at a time as the view scrolls
+FETCH_SIZE = 256
+
+
+class PaperListModel(QAbstractTableModel):
+    """Tagged papers on this device ordered by name, read page by page
+
+    Rows are changed one by one when notified of the papers whose tags
+    changed, instead of reading all papers again. Tags are shown from memory,
+    which is more recent than database while tag changes are written behind.
+    """
+
+    HEADERS = ("Name", "Tags")
+
+    def __init__(self, parent, db: PMDatabase) -> None:
+        super().__init__(parent)
+        self.db = db
+        self.keys = []  # (name, paperId) of rows, sorted
+        self.tags = {}  # paperId to tags shown
+        self.names = {}  # paperId to name
+        self.deferred = {}  # paperId to name, tagged after the loaded rows
+        self.cursor = None  # (name, paperId) of the last paper read
+        self.all_fetched = False
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.keys)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if (
+            orientation == Qt.Orientation.Horizontal
+            and role == Qt.ItemDataRole.DisplayRole
+        ):
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        name, paperId = self.keys[index.row()]
+        return name if index.column() == 0 else self.tags[paperId]
+
+    def paper_id(self, row: int) -> int:
+        return self.keys[row][1]
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and not self.all_fetched
+
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        if parent.isValid() or self.all_fetched:
+            return
+        page = self.db.get_papers_page(self.cursor, FETCH_SIZE)
+        self.all_fetched = len(page) < FETCH_SIZE
+        last = (page[-1][1], page[-1][0]) if page else None
+        # Read on from the page even if none of its papers is shown
+        self.cursor = last or self.cursor
+        for paperId, name in list(self.deferred.items()):
+            if self.all_fetched or (name, paperId) <= last:
+                page.append((paperId, self.deferred.pop(paperId)))
+        rows = {}
+        for paperId, name in page:
+            # Tags not yet written may have been removed since
+            tags = self.db.get_tags_of_paper(paperId)
+            if tags and paperId not in self.tags:
+                rows[(name, paperId)] = ", ".join(tags)
+        if not rows:
+            return
+        first = len(self.keys)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        for (name, paperId), tags in sorted(rows.items()):
+            self.keys.append((name, paperId))
+            self.tags[paperId] = tags
+            self.names[paperId] = name
+        self.endInsertRows()
+
+    def reset(self) -> None:
+        """Read papers again from the first page"""
+        self.beginResetModel()
+        self.keys.clear()
+        self.tags.clear()
+        self.names.clear()
+        self.deferred.clear()
+        self.cursor = None
+        self.all_fetched = False
+        self.endResetModel()
+
+    def update_papers(self, paperIds: list) -> None:
+        """Update, insert or remove the rows of papers whose tags changed"""
+        for paperId in paperIds:
+            tags = ", ".join(self.db.get_tags_of_paper(paperId))
+            if paperId in self.tags:
+                row = bisect.bisect_left(self.keys, (self.names[paperId], paperId))
+                if tags:
+                    self.tags[paperId] = tags
+                    index = self.index(row, 1)
+                    self.dataChanged.emit(index, index)
+                else:
+                    self.beginRemoveRows(QModelIndex(), row, row)
+                    del self.keys[row]
+                    del self.tags[paperId]
+                    del self.names[paperId]
+                    self.endRemoveRows()
+                continue
+            self.deferred.pop(paperId, None)
+            if not tags:
+                continue
+            name = self.db.get_paper_name(paperId)
+            if name is None:
+                continue
+            key = (name, paperId)
+            if not self.all_fetched and (self.cursor is None or key > self.cursor):
+                # Inserted in order by fetchMore
+                self.deferred[paperId] = name
+                continue
+            row = bisect.bisect_left(self.keys, key)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.keys.insert(row, key)
+            self.tags[paperId] = tags
+            self.names[paperId] = name
+            self.endInsertRows()
+
+
+class PaperFilterModel(QSortFilterProxyModel):
+    """Show only the papers whose id is accepted"""
+
+    def __init__(self, parent) -> None:
+        super().__init__(parent)
+        self.accepted: frozenset = None
+
+    def set_accepted(self, paperIds) -> None:
+        """Show only these papers, or all papers if None"""
+        self.accepted = None if paperIds is None else frozenset(paperIds)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if self.accepted is None:
+            return True
+        return self.sourceModel().paper_id(source_row) in self.accepted
 
 
 class FileViewer(QDockWidget):
-    def __init__(self, parent, comm, *args, **kwargs) -> None:
+    def __init__(self, parent, comm: PMCommunicate, db: PMDatabase, *args, **kwargs):
         super().__init__("Papers", parent, *args, **kwargs)
         self.comm = comm
+        self.db = db
         self.setAllowedAreas(Qt.DockWidgetArea.AllDockWidgetAreas)
-        self.model = QSqlQueryModel(self)
-        query = f"""
-        SELECT DISTINCT Papers.name, GROUP_CONCAT(Tags.name, ', ') as Tags
-        FROM Papers, PaperTags, Tags, PaperPaths
-        WHERE
-            Papers.id=PaperTags.paperId 
-            AND Tags.id=PaperTags.tagId 
-            AND PaperPaths.deviceMacAddr='{hex(getMacAddr())}'
-            AND PaperPaths.paperId=Papers.id
-        GROUP BY Papers.name
-        ORDER BY Papers.name
-        """
-
-        self.model.setQuery(query)
-        self.model.setHeaderData(0, Qt.Orientation.Horizontal, "Name")
-        self.model.setHeaderData(1, Qt.Orientation.Horizontal, "Tags")
+        self.model = PaperListModel(self, db)
+        self.proxy = PaperFilterModel(self)
+        self.proxy.setSourceModel(self.model)
 
+        self.filter_edit = QLineEdit(self)
+        self.filter_edit.setPlaceholderText(
+            "Filter by tags... e.g. ml AND (survey OR review) AND NOT read"
+        )
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self.apply_tag_query)
         self.view = QTreeView(self)
-        self.view.setModel(self.model)
+        self.view.setModel(self.proxy)
+        self.view.setRootIsDecorated(False)
+        self.view.setUniformRowHeights(True)
         self.view.setAlternatingRowColors(True)
-        self.setWidget(self.view)
+        self.w = QWidget(self)
+        self.w.setLayout(QVBoxLayout(self.w))
+        self.w.layout().addWidget(self.filter_edit)
+        self.w.layout().addWidget(self.view)
+        self.setWidget(self.w)
+
+    def apply_tag_query(self):
+        """Show only the papers matching the tag query in the filter box"""
+        expression = self.filter_edit.text()
+        paperIds = None
+        if expression.strip():
+            try:
+                paperIds = self.db.query_papers(expression)
+            except TagQueryError as e:
+                # Keep the previous results while the query is being typed
+                self.filter_edit.setToolTip(str(e))
+                self.filter_edit.setStyleSheet("color: red")
+                return
+        self.filter_edit.setToolTip("")
+        self.filter_edit.setStyleSheet("")
+        self.proxy.set_accepted(paperIds)
+        self.comm.tag_query_changed.emit(paperIds)
+
+    def update_papers(self, paperIds: list):
+        """Update the rows of papers whose tags changed"""
+        self.model.update_papers(paperIds)
+        if self.filter_edit.text().strip():
+            self.apply_tag_query()
 
     def refresh(self):
-        self.model.setQuery(self.model.query().executedQuery())
+        """Read all papers again, after the library changed"""
+        self.model.reset()
+        if self.filter_edit.text().strip():
+            self.apply_tag_query()
@@ -15,11 +15,15 @@ from PyQt6.QtWidgets import (
     QCompleter,
     QStyle,
 )
-from PyQt6.QtGui import QFileSystemModel, QColor, QStandardItem, QStandardItemModel
-from PyQt6.QtCore import QDir, Qt, QModelIndex
+from PyQt6.QtGui import QFileSystemModel, QColor
+from PyQt6.QtCore import QDir, Qt, QModelIndex, QStringListModel
 
 from ..database import PMDatabase
 from ..signals import PMCommunicate
+from ..vocabulary import TagVocabulary
+
+TAG_COLOR = QColor("blue")
+UNMATCHED_COLOR = QColor("gray")
 
 
 class FSTreeView(QTreeView):
@@ -36,16 +40,39 @@ class FSTreeView(QTreeView):
             self.comm.pdf_selected.emit(True)
         else:
             self.comm.pdf_selected.emit(False)
+        if self.model().isDir(current):
+            self.comm.directory_selected.emit(selected_file_path)
+        else:
+            directory = self.model().filePath(current.parent())
+            self.comm.directory_selected.emit(directory)
         super().currentChanged(current, previous)
 
 
 class FSModel(QFileSystemModel):
+    """File system with an additional column of the tags of each pdf
+
+    The text of the tag column is computed once per row and kept until the
+    tags of its paper change, so repainting while scrolling does not look up
+    or join tags again.
+    """
+
     def __init__(self, parent, db: PMDatabase) -> None:
         super().__init__(parent)
         self.db = db
+        # Papers matching the tag query, or None to show all as matching
+        self.matches: frozenset = None
+        self.tag_column = super().columnCount()
+        self.tag_cells = {}  # internal id of row to (paperId, tags shown)
+        self.paper_paths = {}  # paperId to paths of rows in tag_cells
         # Show only PDF files
         self.setNameFilters(["*.pdf", "*.PDF"])
         self.setNameFilterDisables(False)
+        # Load tags of a directory once, when it is first shown
+        self.directoryLoaded.connect(self.db.load_dir)
+        # Internal ids of removed rows may be reused by new rows
+        self.rowsAboutToBeRemoved.connect(self.clear_tag_cells)
+        self.modelAboutToBeReset.connect(self.clear_tag_cells)
+        self.fileRenamed.connect(self.clear_tag_cells)
 
     def columnCount(self, parent=QModelIndex()):
         # Add one more column for tags
@@ -55,27 +82,62 @@ class FSModel(QFileSystemModel):
         if (
             orientation == Qt.Orientation.Horizontal
             and role == Qt.ItemDataRole.DisplayRole
-            and section == self.columnCount() - 1
+            and section == self.tag_column
         ):
             return "Tags"
         return super().headerData(section, orientation, role)
 
+    def set_matches(self, paperIds) -> None:
+        self.matches = None if paperIds is None else frozenset(paperIds)
+
+    def tag_cell(self, index: QModelIndex) -> tuple:
+        """Get the paperId and the tags shown of the row of the index"""
+        cell = self.tag_cells.get(index.internalId())
+        if cell is None:
+            cell = (None, "")
+            if not self.isDir(index):
+                path = self.filePath(index)
+                tags = self.db.get_paper_tags(path)
+                paperId = self.db.get_paper_id(path)
+                cell = (paperId, ", ".join(tags))
+                self.paper_paths.setdefault(paperId, set()).add(path)
+            self.tag_cells[index.internalId()] = cell
+        return cell
+
+    def clear_tag_cells(self, *_) -> None:
+        self.tag_cells.clear()
+        self.paper_paths.clear()
+
+    def update_paper_tags(self, paperIds: list) -> None:
+        """Show the new tags of the rows of these papers"""
+        for paperId in paperIds:
+            for path in self.paper_paths.pop(paperId, ()):
+                self.update_path_tags(path)
+
+    def update_path_tags(self, path: str) -> None:
+        """Show the new tags of the row of the path, if shown before"""
+        index = self.index(path, self.tag_column) if path else QModelIndex()
+        if index.isValid() and self.tag_cells.pop(index.internalId(), None):
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+
     def data(self, index, role=Qt.ItemDataRole.DisplayRole):
-        isTagCol = False
-        if index.isValid():
-            isTagCol = index.column() == self.columnCount(index.parent()) - 1
-            info = self.fileInfo(index)
-            path = info.absoluteFilePath()
-            if path:
-                if isTagCol:
-                    if role == Qt.ItemDataRole.DecorationRole:
-                        pass
-                    elif role == Qt.ItemDataRole.DisplayRole:
-                        return ", ".join(self.db.get_paper_tags(path))
-                    elif role == Qt.ItemDataRole.ForegroundRole:
-                        return QColor("blue")
-        if not isTagCol:
+        if not index.isValid():
             return super().data(index, role)
+        if index.column() == self.tag_column:
+            if role == Qt.ItemDataRole.DisplayRole:
+                return self.tag_cell(index)[1]
+            elif role == Qt.ItemDataRole.ForegroundRole:
+                return TAG_COLOR
+            return None
+        if (
+            self.matches is not None
+            and role == Qt.ItemDataRole.ForegroundRole
+            and index.column() == 0
+            and not self.isDir(index)
+            and self.tag_cell(index)[0] not in self.matches
+        ):
+            return UNMATCHED_COLOR
+        return super().data(index, role)
 
 
 class TagBar(QWidget):
@@ -92,12 +154,15 @@ class TagBar(QWidget):
         self.setLayout(self.h_layout)
         self.line_edit = QLineEdit()
         self.comm.pdf_selected.connect(self.setEnabled)
-        self.autocompleteModel = QStandardItemModel()
-        self.completer = QCompleter()
-        self.completer.setModel(self.autocompleteModel)
-        self.completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
-        self.line_edit.setCompleter(self.completer)
-        self.update_completer()
+        self.vocabulary = TagVocabulary()
+        self.vocabulary.load(self.db.get_tag_counts())
+        self.suggestions = QStringListModel(self)
+        # Complete the last of the comma-separated tags being typed
+        self.completer = QCompleter(self.suggestions, self)
+        self.completer.setCompletionMode(
+            QCompleter.CompletionMode.UnfilteredPopupCompletion
+        )
+        self.completer.setWidget(self.line_edit)
         self.line_edit.setPlaceholderText(
             "Add tag(s)... Multiple tags separated by ',' allowed."
         )
@@ -113,6 +178,10 @@ class TagBar(QWidget):
 
     def setup_ui(self):
         self.line_edit.returnPressed.connect(self.create_tags)
+        self.line_edit.textEdited.connect(self.update_completer)
+        self.completer.activated.connect(self.insert_completion)
+        self.comm.tag_counts_changed.connect(self.vocabulary.apply_deltas)
+        self.comm.library_updated.connect(self.reload_vocabulary)
 
     def setEnabled(self, enabled: bool):
         if not enabled:
@@ -120,13 +189,23 @@ class TagBar(QWidget):
             self.refresh()
         self.line_edit.setEnabled(enabled)
 
-    def update_completer(self):
-        all_tags = []
-        for tags in self.db.paperTags.values():
-            all_tags.extend(tags)
-        self.autocompleteModel.clear()
-        for tag in set(all_tags):
-            self.autocompleteModel.appendRow(QStandardItem(tag))
+    def reload_vocabulary(self, *_):
+        self.vocabulary.load(self.db.get_tag_counts())
+
+    def update_completer(self, text: str):
+        """Suggest the most used tags starting with the tag being typed"""
+        prefix = text.split(",")[-1].strip()
+        names = self.vocabulary.suggest(prefix, exclude=self.tags) if prefix else []
+        self.suggestions.setStringList(names)
+        if names:
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
+
+    def insert_completion(self, name: str):
+        text = self.line_edit.text()
+        typed = text[: text.rfind(",") + 1]
+        self.line_edit.setText(f"{typed} {name}" if typed else name)
 
     def create_tags(self):
         if self.line_edit.text():
@@ -139,9 +218,8 @@ class TagBar(QWidget):
         self.tags = list(set(self.tags))
         self.tags.sort(key=lambda x: x.lower())
         if self.curr_filepath:
-            self.db.set_paper_tags(self.curr_filepath, self.tags)
-        if new_tags:
-            self.db.update_paper_tags()
+            added = self.db.set_paper_tags(self.curr_filepath, self.tags)
+            self.notify_paper_tags_changed({tag: 1 for tag in added})
         self.refresh()
 
     def refresh(self):
@@ -151,8 +229,6 @@ class TagBar(QWidget):
             self.add_tag_to_bar(tag)
         self.h_layout.addWidget(self.line_edit)
         self.line_edit.setFocus()
-        self.update_completer()
-        self.comm.tags_updated.emit()
 
     def add_tag_to_bar(self, text):
         tag = QFrame()
@@ -186,9 +262,21 @@ class TagBar(QWidget):
 
     def delete_tag(self, tag_name):
         self.tags.remove(tag_name)
-        self.db.remove_paper_tags(self.curr_filepath, tag_name)
+        if self.db.remove_paper_tags(self.curr_filepath, tag_name):
+            self.notify_paper_tags_changed({tag_name: -1})
         self.refresh()
 
+    def notify_paper_tags_changed(self, deltas: dict):
+        """Notify views of the tags added to or removed from current paper
+
+        Args:
+            deltas (dict): tag name to change in its number of papers
+        """
+        if not deltas:
+            return
+        self.comm.paper_tags_changed.emit([self.db.get_paper_id(self.curr_filepath)])
+        self.comm.tag_counts_changed.emit(deltas)
+
 
 class FSViewer(QDockWidget):
     def __init__(self, parent, comm, db, *args, **kwargs) -> None:
@@ -226,11 +314,29 @@ class FSViewer(QDockWidget):
     def connect_signals(self):
         # Once a paper is selected, get its tags from the db
         self.comm.open_pdf.connect(self.get_paper_tags)
+        self.comm.tag_query_changed.connect(self.show_query_matches)
+        self.comm.paper_tags_changed.connect(self.update_paper_tags)
+        self.comm.library_updated.connect(self.refresh_tags)
+
+    def show_query_matches(self, paperIds) -> None:
+        """Gray out pdfs not matching the tag query"""
+        self.fsmodel.set_matches(paperIds)
+        self.treeView.viewport().update()
+
+    def update_paper_tags(self, paperIds: list) -> None:
+        self.fsmodel.update_paper_tags(paperIds)
+        # Tags of a pdf not yet scanned are kept by path
+        self.fsmodel.update_path_tags(self.tagbar.curr_filepath)
+
+    def refresh_tags(self, *_) -> None:
+        """Show tags again, after papers were added or removed"""
+        self.fsmodel.clear_tag_cells()
+        self.treeView.viewport().update()
 
     def get_paper_tags(self, paper_path: str):
         tags = self.db.get_paper_tags(paper_path)
         self.tagbar.curr_filepath = paper_path
-        self.tagbar.tags = tags
+        self.tagbar.tags = list(tags)
         self.tagbar.create_tags()
 
     def set_dir(self, path: str) -> None:
@@ -241,3 +347,4 @@ class FSViewer(QDockWidget):
         """
         p = pathlib.Path(path).resolve().as_posix()
         self.treeView.setRootIndex(self.fsmodel.index(p))
+        self.comm.directory_selected.emit(p)
@@ -1,10 +1,81 @@
 from PyQt6.QtWidgets import QDockWidget, QTreeView
-from PyQt6.QtSql import QSqlQueryModel
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from ..database import PMDatabase
+
+
+class TagCountModel(QAbstractTableModel):
+    """Tags in use and their number of papers, most frequent first
+
+    Counts are changed by deltas as tags are added to or removed from papers,
+    and rows are sorted again locally.
+    """
+
+    HEADERS = ("Tag", "Freq")
+
+    def __init__(self, parent, db: PMDatabase) -> None:
+        super().__init__(parent)
+        self.db = db
+        self.rows = []  # [name, count], sorted
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if (
+            orientation == Qt.Orientation.Horizontal
+            and role == Qt.ItemDataRole.DisplayRole
+        ):
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.rows[index.row()][index.column()]
+
+    @staticmethod
+    def _sort_key(row: list) -> tuple:
+        return (-row[1], row[0].lower(), row[0])
+
+    def reload(self) -> None:
+        """Read all counts again"""
+        self.beginResetModel()
+        self.rows = [[name, n] for name, n in self.db.get_tag_counts().items()]
+        self.rows.sort(key=self._sort_key)
+        self.endResetModel()
+
+    def apply_deltas(self, deltas: dict) -> None:
+        """Change the counts of tags
+
+        Args:
+            deltas (dict): tag name to change in its number of papers
+        """
+        self.layoutAboutToBeChanged.emit()
+        oldRows = list(self.rows)
+        byName = {row[0]: row for row in self.rows}
+        for name, delta in deltas.items():
+            row = byName.get(name)
+            if row is None:
+                row = byName[name] = [name, 0]
+                self.rows.append(row)
+            row[1] += delta
+        self.rows = [row for row in self.rows if row[1] > 0]
+        self.rows.sort(key=self._sort_key)
+        # Keep the selection on the same tags
+        newRow = {id(row): i for i, row in enumerate(self.rows)}
+        for index in self.persistentIndexList():
+            i = newRow.get(id(oldRows[index.row()]))
+            newIndex = QModelIndex() if i is None else self.index(i, index.column())
+            self.changePersistentIndex(index, newIndex)
+        self.layoutChanged.emit()
 
 
 class TagViewer(QDockWidget):
-    def __init__(self, parent, comm, *args, **kwargs) -> None:
+    def __init__(self, parent, comm, db: PMDatabase, *args, **kwargs) -> None:
         super().__init__("Tags", parent, *args, **kwargs)
         self.comm = comm
         self.setAllowedAreas(Qt.DockWidgetArea.AllDockWidgetAreas)
@@ -13,20 +84,16 @@ class TagViewer(QDockWidget):
             | QDockWidget.DockWidgetFeature.DockWidgetFloatable
             | QDockWidget.DockWidgetFeature.DockWidgetClosable
         )
-        self.model = QSqlQueryModel(self)
-        self.model.setQuery(
-            """
-        SELECT DISTINCT Tags.name, count(paperId) AS freq 
-        FROM Tags LEFT JOIN PaperTags
-        ON Tags.id=PaperTags.tagId GROUP BY Tags.id HAVING freq>0 
-        ORDER BY freq DESC"""
-        )
-        self.model.setHeaderData(0, Qt.Orientation.Horizontal, "Tag")
-        self.model.setHeaderData(1, Qt.Orientation.Horizontal, "Freq")
+        self.model = TagCountModel(self, db)
+        self.model.reload()
         self.view = QTreeView(self)
         self.view.setModel(self.model)
+        self.view.setRootIsDecorated(False)
         self.setWidget(self.view)
 
+    def update_counts(self, deltas: dict):
+        self.model.apply_deltas(deltas)
+
     def refresh(self):
-        # Refresh the view by executing again the query
-        self.model.setQuery(self.model.query().executedQuery())
+        # Read all counts again, after papers were added or removed
+        self.model.reload()
@@ -0,0 +1,38 @@
+import typing
+import threading
+
+from . import workers
+
+
+def extract_pages(path: str) -> typing.Optional[list]:
+    """Text of each page of a pdf, run in a worker process
+
+    Args:
+        path (str): path to pdf
+
+    Returns:
+        typing.Optional[list]: text per page, or None if the pdf cannot be read
+    """
+    import fitz
+
+    try:
+        with fitz.open(path) as doc:
+            return [page.get_text() for page in doc]
+    except Exception:
+        return None
+
+
+def extract_texts(items: list, stop: threading.Event) -> typing.Iterator[tuple]:
+    """Extract the text of pdfs in the process pool, one document at a time
+
+    See `workers.map_windowed`, the memory used does not grow with the number
+    of documents.
+
+    Args:
+        items (list): list of (path, ...) tuples
+        stop (threading.Event): set to stop early
+
+    Yields:
+        tuple: (item, text per page or None), in order of completion
+    """
+    return workers.map_windowed(extract_pages, items, stop, lambda item: item[0])
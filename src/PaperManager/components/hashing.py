@@ -0,0 +1,80 @@
+import os
+import typing
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import workers
+
+# Size of the blocks at the start and the end of a pdf used by prefilter hash
+PREFILTER_BLOCK_SIZE = 16 * 1024
+# Size of the chunks read when computing the full digest
+DIGEST_CHUNK_SIZE = 1024 * 1024
+# Below this number of pdfs, digests are computed in the calling thread
+MIN_FILES_FOR_PROCESS_POOL = 4
+
+
+def prefilter_hash(path: str) -> typing.Optional[str]:
+    """Cheap hash of a pdf from its size and its first and last blocks
+
+    Args:
+        path (str): path to pdf
+
+    Returns:
+        typing.Optional[str]: hash, or None if the file cannot be read
+    """
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            h = hashlib.blake2b(f.read(PREFILTER_BLOCK_SIZE), digest_size=16)
+            if size > PREFILTER_BLOCK_SIZE:
+                f.seek(max(size - PREFILTER_BLOCK_SIZE, PREFILTER_BLOCK_SIZE))
+                h.update(f.read(PREFILTER_BLOCK_SIZE))
+    except OSError:
+        return None
+    return f"{size}:{h.hexdigest()}"
+
+
+def full_digest(path: str) -> typing.Optional[str]:
+    """SHA-256 digest of the whole pdf
+
+    Args:
+        path (str): path to pdf
+
+    Returns:
+        typing.Optional[str]: digest, or None if the file cannot be read
+    """
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(DIGEST_CHUNK_SIZE):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def prefilter_hashes(paths: list) -> list:
+    """Prefilter hashes of pdfs, read concurrently as this is bound by IO"""
+    if len(paths) < MIN_FILES_FOR_PROCESS_POOL:
+        return [prefilter_hash(path) for path in paths]
+    with ThreadPoolExecutor() as pool:
+        return list(pool.map(prefilter_hash, paths))
+
+
+def full_digests(paths: list) -> dict:
+    """Full digests of pdfs, computed in the process pool to use all cores
+
+    Returns:
+        dict: path to digest
+    """
+    if len(paths) < MIN_FILES_FOR_PROCESS_POOL:
+        return {path: full_digest(path) for path in paths}
+    pool = workers.process_pool()
+    try:
+        digests = list(pool.map(full_digest, paths, chunksize=4))
+    except BrokenProcessPool:
+        # A worker died, digests are then computed here
+        workers.discard(pool)
+        digests = [full_digest(path) for path in paths]
+    return dict(zip(paths, digests))
@@ -1,16 +1,26 @@
 import os
 import typing
+import threading
 from pathlib import Path
 from PyQt6.QtWidgets import QMainWindow, QFileDialog, QMessageBox
-from PyQt6.QtGui import QActionGroup, QAction, QDesktopServices, QKeySequence
+from PyQt6.QtGui import (
+    QActionGroup,
+    QAction,
+    QDesktopServices,
+    QKeySequence,
+    QCloseEvent,
+)
 from PyQt6.QtCore import Qt, QUrl, QThreadPool
 
 from .pdf_viewer.pdfviewer import PDFViewer
 from .filesystem_viewer.fsviewer import FSViewer
 from .filesystem_viewer.fileviewer import FileViewer
 from .filesystem_viewer.tagviewer import TagViewer
+from .search_viewer.searchviewer import SearchViewer
+from .thumbnail_viewer.thumbnailviewer import ThumbnailViewer
 from .signals import PMCommunicate
-from .tasks import PMUpdateDirectory
+from .tasks import PMUpdateDirectory, PMIndexFullText
+from .watcher import PMLibraryWatcher
 from .database import PMDatabase, Settings
 
 
@@ -21,11 +31,21 @@ class PMMainWindow(QMainWindow):
         self.curr_dir: typing.Optional[str] = None
         self.comm = PMCommunicate()
         self.pool = QThreadPool.globalInstance()
-        self.db = PMDatabase()
+        # Tasks writing to database run one at a time
+        self.db_pool = QThreadPool(self)
+        self.db_pool.setMaxThreadCount(1)
+        self.db = PMDatabase(lazy=True)
+        # Text of pdfs is indexed in the background, one task at a time
+        self.text_pool = QThreadPool(self)
+        self.text_pool.setMaxThreadCount(1)
+        self.text_index_stop = threading.Event()
+        self.watcher = PMLibraryWatcher(self, self.comm, self.db, self.db_pool)
         self.fsviewer = FSViewer(parent=self, comm=self.comm, db=self.db)
-        self.fileviewer = FileViewer(parent=self, comm=self.comm)
+        self.fileviewer = FileViewer(parent=self, comm=self.comm, db=self.db)
         self.pdfviewer = PDFViewer(parent=self, comm=self.comm)
-        self.tagviewer = TagViewer(parent=self, comm=self.comm)
+        self.tagviewer = TagViewer(parent=self, comm=self.comm, db=self.db)
+        self.searchviewer = SearchViewer(parent=self, comm=self.comm, db=self.db)
+        self.thumbnailviewer = ThumbnailViewer(parent=self, comm=self.comm, db=self.db)
 
         # Setup layout, menu, etc.
         self.setup()
@@ -38,6 +58,10 @@ class PMMainWindow(QMainWindow):
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.tagviewer)
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.fileviewer)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.pdfviewer)
+        self.tabifyDockWidget(self.fileviewer, self.searchviewer)
+        self.tabifyDockWidget(self.pdfviewer, self.thumbnailviewer)
+        self.fileviewer.raise_()
+        self.pdfviewer.raise_()
         self.curr_dir = self.db.get_setting(Settings.LastDirectory)
         self.set_dir()
 
@@ -63,6 +87,9 @@ class PMMainWindow(QMainWindow):
         quitAction.triggered.connect(self._close)
 
         # Edit menu actions
+        checkTagCountsAction = QAction("Check tag counts", self)
+        editMenu.addAction(checkTagCountsAction)
+        checkTagCountsAction.triggered.connect(self.act_check_tag_counts)
 
         # View menu actions
         viewActionGroup = QActionGroup(self)
@@ -87,15 +114,32 @@ class PMMainWindow(QMainWindow):
         helpQtAction.triggered.connect(lambda: QMessageBox.aboutQt(self, "About Qt"))
 
     def _close(self):
-        # Close database
-        self.db.close()
         # Close main window
         return self.close()
 
+    def closeEvent(self, evt: QCloseEvent) -> None:
+        # Stop watching, wait for tasks writing to database, then close database
+        self.watcher.set_root("")
+        self.text_index_stop.set()
+        self.text_pool.waitForDone()
+        self.db_pool.waitForDone()
+        self.pdfviewer.close()
+        self.thumbnailviewer.close()
+        self.db.close()
+        return super().closeEvent(evt)
+
     def connect_signals(self) -> None:
         self.comm.open_pdf.connect(self.act_load_pdf)
-        self.comm.tags_updated.connect(self.tagviewer.refresh)
-        self.comm.tags_updated.connect(self.fileviewer.refresh)
+        self.comm.tag_counts_changed.connect(self.tagviewer.update_counts)
+        self.comm.library_updated.connect(self.tagviewer.refresh)
+        self.comm.paper_tags_changed.connect(self.fileviewer.update_papers)
+        self.comm.library_updated.connect(self.fileviewer.refresh)
+        self.comm.update_directory_stats.connect(self.show_update_directory_stats)
+        self.comm.update_directory_failed.connect(self.show_update_directory_error)
+        self.comm.update_directory_done.connect(self.index_text)
+        self.comm.library_updated.connect(self.index_text)
+        self.comm.text_index_progress.connect(self.show_text_index_progress)
+        self.comm.open_pdf_page.connect(self.act_load_pdf_page)
 
     def check_directory_set(func: typing.Callable):
         """Dectorator to check if the current directory is set
@@ -114,11 +158,32 @@ class PMMainWindow(QMainWindow):
 
     def set_dir(self):
         # Set project directory and try to load data, if any
-        self.fsviewer.set_dir(Path(self.curr_dir).resolve().as_posix())
+        root_dir = Path(self.curr_dir).resolve().as_posix()
+        self.fsviewer.set_dir(root_dir)
         self.db.set_setting(Settings.LastDirectory, self.curr_dir)
-        # Add all pdfs in the directory to database
-        task = PMUpdateDirectory(self.comm, self.db, self.curr_dir)
-        self.pool.start(task)
+        # Add all pdfs in the directory to database, then watch for changes
+        self.watcher.set_root(root_dir)
+        task = PMUpdateDirectory(self.comm, self.db, root_dir)
+        self.db_pool.start(task)
+
+    def show_update_directory_stats(self, path: str, files: int, rate: float):
+        """Report the number of pdfs scanned and the speed in the status bar"""
+        msg = f"Indexed {files} new or changed PDFs in {path} ({rate:.0f} files/sec)"
+        self.statusBar().showMessage(msg)
+
+    def show_update_directory_error(self, path: str, error: str):
+        """Report changes not written to database, retried on the next scan"""
+        msg = f"Failed to index some PDFs in {path}: {error}"
+        self.statusBar().showMessage(msg)
+
+    def index_text(self, *args):
+        """Index the text of new pdfs in the background, unless already running"""
+        if self.text_pool.activeThreadCount() == 0:
+            task = PMIndexFullText(self.comm, self.db, self.text_index_stop)
+            self.text_pool.start(task)
+
+    def show_text_index_progress(self, done: int, total: int):
+        self.statusBar().showMessage(f"Indexed the text of {done}/{total} PDFs")
 
     def open_dir(self):
         """Prompt the user to select directory"""
@@ -177,12 +242,30 @@ class PMMainWindow(QMainWindow):
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.tagviewer)
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.fileviewer)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.pdfviewer)
+        self.searchviewer.show()
+        self.tabifyDockWidget(self.fileviewer, self.searchviewer)
+        self.thumbnailviewer.show()
+        self.tabifyDockWidget(self.pdfviewer, self.thumbnailviewer)
 
     def act_enter_zen_mode(self) -> None:
         """Show only the editor"""
         self.fsviewer.hide()
         self.pdfviewer.hide()
 
+    def act_check_tag_counts(self) -> None:
+        """Recount the papers of each tag and compare with database"""
+        mismatches = self.db.check_tag_counts(rebuild=True)
+        self.tagviewer.refresh()
+        if not mismatches:
+            self.show_message_box("Tag counts are consistent with the database.")
+            return
+        lines = [
+            f"{name}: {n} in memory, {m} in database"
+            for name, (n, m) in mismatches.items()
+        ]
+        msg = "Tag counts differ from the database:\n" + "\n".join(lines)
+        self.show_message_box(msg, QMessageBox.Icon.Warning)
+
     def act_load_pdf(self, filepath: str) -> None:
         """Load and display PDF given the filepath
 
@@ -190,3 +273,13 @@ class PMMainWindow(QMainWindow):
             filepath (str): path to PDF file
         """
         self.pdfviewer.load_file(filepath, display=True)
+
+    def act_load_pdf_page(self, filepath: str, page_number: int) -> None:
+        """Load PDF given the filepath and display the page
+
+        Args:
+            filepath (str): path to PDF file
+            page_number (int): 1 indexed page number
+        """
+        self.comm.open_pdf.emit(filepath)
+        self.pdfviewer.load_file(filepath, display=True, page_number=page_number)
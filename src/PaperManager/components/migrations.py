@@ -0,0 +1,248 @@
+import typing
+from dataclasses import dataclass
+
+from PyQt6.QtSql import QSqlDatabase, QSqlQuery
+
+
+@dataclass
+class Migration:
+    """A schema change from the previous version to this version
+
+    The schema version of a database is stored in `PRAGMA user_version`. A
+    migration runs in a single transaction together with the update of the
+    version, so an interrupted upgrade leaves the database at the previous
+    version. Released migrations are never edited, new ones are appended.
+    """
+
+    version: int
+    description: str
+    statements: typing.Tuple[str, ...] = ()
+    # Additional steps that need to inspect the database, see `_exec`
+    apply: typing.Optional[typing.Callable[[QSqlQuery], None]] = None
+
+
+def _exec(query: QSqlQuery, statement: str) -> None:
+    """Execute a statement of a migration
+
+    Raises:
+        RuntimeError: if it fails, so the migration is rolled back
+    """
+    if not query.exec(statement):
+        raise RuntimeError(query.lastError().text())
+
+
+def _rebuild_papers_by_content(query: QSqlQuery) -> None:
+    """Rebuild Papers identified by name into Papers identified by content
+
+    Existing papers keep their ids and tags. They have no hash yet and are
+    adopted by the first pdf found at one of their paths on the next scan,
+    for which the scan manifest is reset.
+    """
+    _exec(query, "PRAGMA table_info(Papers)")
+    columns = set()
+    while query.next():
+        columns.add(query.value(1))
+    if "digest" in columns:
+        return
+    for statement in (
+        """
+        CREATE TABLE PapersByContent (
+            id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            prehash TEXT,
+            digest TEXT
+        )
+        """,
+        "INSERT INTO PapersByContent(id,name) SELECT id, name FROM Papers",
+        "DROP TABLE Papers",
+        "ALTER TABLE PapersByContent RENAME TO Papers",
+        "DELETE FROM ScanFiles",
+        "DELETE FROM ScanDirs",
+    ):
+        _exec(query, statement)
+
+
+MIGRATIONS = [
+    Migration(
+        1,
+        "Settings, tags, papers and their locations",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS Settings (
+                key TEXT PRIMARY KEY UNIQUE NOT NULL,
+                value TEXT NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS Tags (
+                id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
+                name TEXT UNIQUE NOT NULL,
+                hexColor VARCHAR(8)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS Papers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
+                name TEXT UNIQUE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS PaperPaths (
+                paperId INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                deviceMacAddr TEXT NOT NULL,
+                PRIMARY KEY (paperId,path),
+                FOREIGN KEY (paperId) REFERENCES Papers(id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS PaperTags (
+                paperId INTEGER NOT NULL,
+                tagId INTEGER NOT NULL,
+                PRIMARY KEY (paperId, tagId),
+                FOREIGN KEY (paperId) REFERENCES Papers(id) ON DELETE CASCADE,
+                FOREIGN KEY (tagId) REFERENCES Tags(id) ON DELETE CASCADE
+            )
+            """,
+        ),
+    ),
+    Migration(
+        2,
+        "Scan manifest, to rescan only directories changed since last scan",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS ScanDirs (
+                path TEXT PRIMARY KEY NOT NULL,
+                parent TEXT,
+                mtime INTEGER NOT NULL,
+                entryCount INTEGER NOT NULL,
+                lastScan REAL NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ScanFiles (
+                path TEXT PRIMARY KEY NOT NULL,
+                dir TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ScanFilesDir ON ScanFiles(dir)",
+        ),
+    ),
+    Migration(
+        3,
+        "Papers identified by content hash",
+        ("CREATE INDEX IF NOT EXISTS PapersPrehash ON Papers(prehash)",),
+        apply=_rebuild_papers_by_content,
+    ),
+    Migration(
+        4,
+        "Indexes for lookups by path, device and tag",
+        (
+            "CREATE INDEX IF NOT EXISTS PaperPathsPath ON PaperPaths(path)",
+            """
+            CREATE INDEX IF NOT EXISTS PaperPathsDevice
+            ON PaperPaths(deviceMacAddr, paperId)
+            """,
+            "CREATE INDEX IF NOT EXISTS PaperTagsTag ON PaperTags(tagId, paperId)",
+        ),
+    ),
+    Migration(
+        5,
+        "Full-text index of the pages of papers",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS PageTexts (
+                id INTEGER PRIMARY KEY,
+                paperId INTEGER NOT NULL,
+                page INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                FOREIGN KEY (paperId) REFERENCES Papers(id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS PageTextsPaper ON PageTexts(paperId)",
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS PageTextsSearch
+            USING fts5(text, content='PageTexts', content_rowid='id')
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS PageTextsInsert AFTER INSERT ON PageTexts
+            BEGIN
+                INSERT INTO PageTextsSearch(rowid, text) VALUES (new.id, new.text);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS PageTextsDelete AFTER DELETE ON PageTexts
+            BEGIN
+                INSERT INTO PageTextsSearch(PageTextsSearch, rowid, text)
+                VALUES ('delete', old.id, old.text);
+            END
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS TextIndexed (
+                paperId INTEGER PRIMARY KEY NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                pages INTEGER NOT NULL,
+                FOREIGN KEY (paperId) REFERENCES Papers(id)
+            )
+            """,
+        ),
+    ),
+    Migration(
+        6,
+        "Index to page through papers by name",
+        ("CREATE INDEX IF NOT EXISTS PapersName ON Papers(name, id)",),
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_version(db: QSqlDatabase) -> int:
+    query = QSqlQuery(db)
+    query.exec("PRAGMA user_version")
+    version = int(query.value(0)) if query.next() else 0
+    query.finish()
+    return version
+
+
+def migrate(db: QSqlDatabase, target: int = LATEST_VERSION) -> int:
+    """Upgrade the schema of the database to the target version
+
+    Args:
+        db (QSqlDatabase): open connection
+        target (int, optional): version. Defaults to the latest.
+
+    Raises:
+        RuntimeError: if a migration fails, which is then rolled back
+
+    Returns:
+        int: schema version of the database
+    """
+    version = get_version(db)
+    query = QSqlQuery(db)
+    for migration in MIGRATIONS:
+        if migration.version <= version or migration.version > target:
+            continue
+        db.transaction()
+        try:
+            if migration.apply is not None:
+                migration.apply(query)
+            for statement in migration.statements:
+                _exec(query, statement)
+            _exec(query, f"PRAGMA user_version={migration.version}")
+        except RuntimeError as e:
+            query.finish()
+            db.rollback()
+            msg = f"Migration {migration.version} failed: {e}"
+            raise RuntimeError(msg) from e
+        query.finish()
+        if not db.commit():
+            db.rollback()
+            msg = f"Migration {migration.version} failed: {db.lastError().text()}"
+            raise RuntimeError(msg)
+        version = migration.version
+    return version
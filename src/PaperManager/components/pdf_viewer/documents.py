@@ -0,0 +1,158 @@
+import os
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import fitz
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+# Number of documents kept open
+DOCUMENT_POOL_SIZE = 8
+
+
+@dataclass
+class OpenDocument:
+    """A parsed pdf and the page it was last shown at"""
+
+    path: str
+    mtime: int
+    doc: fitz.Document
+    last_page: int = 1  # 1 indexed
+
+    @property
+    def key(self) -> tuple:
+        """Identity of the document in the page cache"""
+        return (self.path, self.mtime)
+
+
+class DocumentPool:
+    """Recently opened documents, least recently used first
+
+    A document is reused while its file is not modified, so switching back
+    and forth between a few papers does not parse them again.
+
+    Args:
+        size (int, optional): maximum number of documents kept open.
+            Defaults to DOCUMENT_POOL_SIZE.
+    """
+
+    def __init__(self, size=DOCUMENT_POOL_SIZE) -> None:
+        self.size = size
+        self.documents = OrderedDict()  # path to OpenDocument
+        # Document shown, kept open even once dropped from the pool
+        self.shown: typing.Optional[OpenDocument] = None
+
+    def get(self, path: str) -> typing.Optional[OpenDocument]:
+        """Get the open document of the path, if its file is unchanged"""
+        document = self.documents.get(path)
+        if document is None:
+            return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != document.mtime:
+            self._discard(self.documents.pop(path))
+            return None
+        self.documents.move_to_end(path)
+        return document
+
+    def add(self, document: OpenDocument) -> None:
+        old = self.documents.pop(document.path, None)
+        if old is not None and old is not document:
+            self._discard(old)
+        self.documents[document.path] = document
+        while len(self.documents) > self.size:
+            _, evicted = self.documents.popitem(last=False)
+            self._discard(evicted)
+
+    def show(self, document: typing.Optional[OpenDocument]) -> None:
+        """Set the document shown, closing the previous one if not in the pool"""
+        previous, self.shown = self.shown, document
+        if previous is not None and previous is not document:
+            self._discard(previous)
+
+    def _discard(self, document: OpenDocument) -> None:
+        # Close a document neither in the pool nor shown
+        if document is self.shown:
+            return
+        if self.documents.get(document.path) is document:
+            return
+        document.doc.close()
+
+    def close(self) -> None:
+        """Close all documents, including the one shown"""
+        self.shown = None
+        for document in self.documents.values():
+            document.doc.close()
+        self.documents.clear()
+
+
+class OpenDocumentTask(QRunnable):
+    """Task to open and parse a pdf, reporting to the opener"""
+
+    def __init__(self, opener: "DocumentOpener", path: str) -> None:
+        super().__init__()
+        self.opener = opener
+        self.path = path
+
+    def run(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            doc = fitz.open(self.path)
+            # Parse the page tree here rather than in the GUI thread
+            doc.page_count
+            document = OpenDocument(self.path, mtime, doc)
+        except Exception:
+            document = None
+        self.opener.opened.emit(self.path, document)
+
+
+class DocumentOpener(QObject):
+    """Open pdfs in a background thread, the latest requested winning
+
+    One pdf is opened at a time. Requests made meanwhile replace each other,
+    and only the latest is opened next, so moving through many files quickly
+    opens only the file settled on.
+    """
+
+    # path and OpenDocument, or None if it cannot be opened
+    opened = pyqtSignal(str, object)
+    # the latest requested path and its OpenDocument, or None
+    ready = pyqtSignal(str, object)
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.opening: typing.Optional[str] = None
+        self.latest: typing.Optional[str] = None
+        self.opened.connect(self._opened)
+
+    def open(self, path: str) -> None:
+        self.latest = path
+        if self.opening is None:
+            self._start(path)
+
+    def cancel(self) -> None:
+        """Forget the latest request, e.g. if it was served from the pool"""
+        self.latest = None
+
+    def _start(self, path: str) -> None:
+        self.opening = path
+        self.pool.start(OpenDocumentTask(self, path))
+
+    def _opened(self, path: str, document: typing.Optional[OpenDocument]) -> None:
+        self.opening = None
+        if path == self.latest:
+            self.latest = None
+            self.ready.emit(path, document)
+        else:
+            if document is not None:
+                document.doc.close()
+            if self.latest is not None:
+                self._start(self.latest)
+
+    def shutdown(self) -> None:
+        self.latest = None
+        self.pool.waitForDone()
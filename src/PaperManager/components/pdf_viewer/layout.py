@@ -0,0 +1,49 @@
+import bisect
+
+# Space between pages in continuous mode, in logical pixels
+PAGE_GAP = 8
+
+
+class ContinuousLayout:
+    """Positions of all pages of a document stacked vertically
+
+    Pages are scaled by the same factor so the widest page fits the width.
+    Positions are computed from page sizes only, without rendering.
+
+    Args:
+        page_rects (list): fitz.Rect of each page, in points
+        width (float): width of the view in logical pixels
+    """
+
+    def __init__(self, page_rects: list, width: float) -> None:
+        self.width = width
+        # Logical pixels per point
+        self.scale = width / max(rect.width for rect in page_rects)
+        self.rects = page_rects
+        self.tops = []
+        self.heights = []
+        y = 0.0
+        for rect in page_rects:
+            self.tops.append(y)
+            self.heights.append(rect.height * self.scale)
+            y += rect.height * self.scale + PAGE_GAP
+        self.height = y - PAGE_GAP
+
+    def page_at(self, y: float) -> int:
+        """Get the page at the height, or the next page if in a gap"""
+        number = bisect.bisect_right(self.tops, y) - 1
+        if number < 0:
+            return 0
+        if y > self.tops[number] + self.heights[number]:
+            number += 1
+        return min(number, len(self.tops) - 1)
+
+    def pages_in(self, y0: float, y1: float) -> range:
+        """Get the pages intersecting the heights from y0 to y1"""
+        first = self.page_at(max(y0, 0.0))
+        last = max(bisect.bisect_left(self.tops, y1) - 1, first)
+        return range(first, min(last, len(self.tops) - 1) + 1)
+
+    def left(self, number: int) -> float:
+        """Left of the page, centered in the view"""
+        return (self.width - self.rects[number].width * self.scale) / 2
@@ -0,0 +1,43 @@
+import fitz
+
+# Side of the square cells of the grid of links, in points
+LINK_CELL_SIZE = 36
+
+
+class LinkIndex:
+    """Links of a page, in page coordinates, in a uniform grid
+
+    Each cell of the grid lists the links whose rectangles intersect it, so
+    the link at a point is found by testing only the few links of its cell
+    instead of all links of the page.
+
+    Args:
+        links (list): links of the page, as returned by `fitz.Page.get_links`
+    """
+
+    def __init__(self, links: list) -> None:
+        self.links = links
+        self.cells = {}  # (column, row) to indexes of links
+        size = LINK_CELL_SIZE
+        for idx, link in enumerate(links):
+            r: fitz.Rect = link["from"]
+            columns = range(int(r.x0 // size), int(r.x1 // size) + 1)
+            rows = range(int(r.y0 // size), int(r.y1 // size) + 1)
+            for column in columns:
+                for row in rows:
+                    self.cells.setdefault((column, row), []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    def link_at(self, point: fitz.Point) -> int:
+        """Get the index of the link at the point of the page, or -1"""
+        cell = (int(point.x // LINK_CELL_SIZE), int(point.y // LINK_CELL_SIZE))
+        for idx in self.cells.get(cell, ()):
+            if self.links[idx]["from"].contains(point):
+                return idx
+        return -1
+
+
+# Links of a page without links, or not yet shown
+NO_LINKS = LinkIndex([])
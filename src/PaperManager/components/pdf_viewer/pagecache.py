@@ -0,0 +1,105 @@
+import typing
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import fitz
+from PyQt6.QtGui import QImage
+
+from .links import LinkIndex
+
+# Memory budget of rendered pages, a few dozen pages at screen size
+DEFAULT_PAGE_CACHE_BUDGET = 128 * 1024 * 1024
+# Memory budget of tiles of zoomed pages
+DEFAULT_TILE_CACHE_BUDGET = 64 * 1024 * 1024
+# Number of pages whose links are kept
+LINK_CACHE_PAGES = 1024
+
+
+@dataclass
+class PageCacheStats:
+    """Statistics of the rendered pages in a page cache"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    pages: int = 0
+    bytes: int = 0
+    budget: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class PageCache:
+    """Rendered pages, least recently used first, within a memory budget
+
+    Pages are keyed by (document, page number, height, device pixel ratio),
+    where the document is identified by its path and modification time. The
+    links of pages are kept as well, by (document, page number), as they do
+    not depend on the size shown. The cache can be used from any thread.
+
+    Args:
+        budget (int, optional): memory budget of rendered pages in bytes.
+            Defaults to DEFAULT_PAGE_CACHE_BUDGET.
+    """
+
+    def __init__(self, budget=DEFAULT_PAGE_CACHE_BUDGET) -> None:
+        self.lock = threading.Lock()
+        self.pages = OrderedDict()  # key to QImage
+        self.links = OrderedDict()  # (document, page number) to LinkIndex
+        self.stats = PageCacheStats(budget=budget)
+
+    def get(self, key: tuple) -> typing.Optional[QImage]:
+        """Get a rendered page, marking it as recently used"""
+        with self.lock:
+            image = self.pages.get(key)
+            if image is None:
+                self.stats.misses += 1
+                return None
+            self.pages.move_to_end(key)
+            self.stats.hits += 1
+            return image
+
+    def find(self, document: tuple, page_number: int) -> typing.Optional[QImage]:
+        """Get the page rendered at any size, most recently used first"""
+        with self.lock:
+            for key in reversed(self.pages):
+                if key[0] == document and key[1] == page_number:
+                    return self.pages[key]
+        return None
+
+    def __contains__(self, key: tuple) -> bool:
+        with self.lock:
+            return key in self.pages
+
+    def put(self, key: tuple, image: QImage) -> None:
+        """Add a rendered page, evicting least recently used pages as needed"""
+        with self.lock:
+            old = self.pages.pop(key, None)
+            if old is not None:
+                self.stats.bytes -= old.sizeInBytes()
+            self.pages[key] = image
+            self.stats.bytes += image.sizeInBytes()
+            while self.stats.bytes > self.stats.budget and len(self.pages) > 1:
+                _, evicted = self.pages.popitem(last=False)
+                self.stats.bytes -= evicted.sizeInBytes()
+                self.stats.evictions += 1
+            self.stats.pages = len(self.pages)
+
+    def get_links(self, document: tuple, page: fitz.Page) -> LinkIndex:
+        """Get the links of the page, read from the document and indexed once"""
+        key = (document, page.number)
+        with self.lock:
+            links = self.links.get(key)
+            if links is not None:
+                self.links.move_to_end(key)
+                return links
+        links = LinkIndex(page.get_links())
+        with self.lock:
+            self.links[key] = links
+            if len(self.links) > LINK_CACHE_PAGES:
+                self.links.popitem(last=False)
+        return links
@@ -1,8 +1,11 @@
 import os
+import math
 import pathlib
+import dataclasses
 
 import fitz
 from PyQt6.QtWidgets import (
+    QApplication,
     QWidget,
     QDockWidget,
     QLabel,
@@ -10,28 +13,62 @@ from PyQt6.QtWidgets import (
     QToolBar,
     QStyle,
     QLineEdit,
+    QHBoxLayout,
+    QScrollBar,
 )
 from PyQt6.QtGui import (
     QPixmap,
-    QImage,
     QPainter,
     QColor,
     QPen,
     QAction,
+    QKeySequence,
     QIntValidator,
     QMouseEvent,
     QCursor,
     QWheelEvent,
     QDesktopServices,
     QResizeEvent,
+    QPaintEvent,
 )
-from PyQt6.QtCore import Qt, QByteArray, QRectF, QUrl
+from PyQt6.QtCore import Qt, QPointF, QRectF, QTimer, QUrl
 
 from ..signals import PMCommunicate
+from .layout import ContinuousLayout
+from .links import NO_LINKS, LinkIndex
+from .documents import DocumentOpener, DocumentPool, OpenDocument
+from .pagecache import (
+    DEFAULT_PAGE_CACHE_BUDGET,
+    DEFAULT_TILE_CACHE_BUDGET,
+    PageCache,
+    PageCacheStats,
+)
+from .prefetch import PagePrefetcher
+from .render import fit_zoom, render_page
+
+# Wait for this long after the last page turn or resize to render sharply
+RENDER_DELAY_MS = 100
+# Resolution of the preview of a page rendered while input is in progress
+PREVIEW_SCALE = 0.25
+# Zoomed pages are rendered in square tiles of this many device pixels
+TILE_SIZE = 256
+# Wait for this long after the last zoom or pan to render missing tiles
+TILE_DELAY_MS = 50
+# Zoom relative to the page fitting the view height
+ZOOM_STEP = 1.25
+MAX_ZOOM = 8.0
 
 
 class PDFViewer(QDockWidget):
-    def __init__(self, parent, comm: PMCommunicate, *args, **kwargs):
+    def __init__(
+        self,
+        parent,
+        comm: PMCommunicate,
+        *args,
+        cache_budget=DEFAULT_PAGE_CACHE_BUDGET,
+        tile_cache_budget=DEFAULT_TILE_CACHE_BUDGET,
+        **kwargs,
+    ):
         super().__init__("PDF Viewer", parent, *args, **kwargs)
         self.setAllowedAreas(Qt.DockWidgetArea.AllDockWidgetAreas)
         self.setFeatures(
@@ -44,25 +81,77 @@ class PDFViewer(QDockWidget):
         self.curr_page = 1  # 1 indexed
         self.total_pages = 0
         self.doc = None
-        self.curr_page_links = []
+        self.document: OpenDocument = None
+        # Path and modification time of the loaded PDF file
+        self.doc_key = None
+        # Recently opened PDF files, and the file being opened
+        self.documents = DocumentPool()
+        self.opener = DocumentOpener(self)
+        self.opener.ready.connect(self._document_ready)
+        self.pending_display = (False, None)
+        # (doc_key, page number) of the page in the view area
+        self.shown_page = None
+        # Pages are rendered at full resolution once input settles
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(RENDER_DELAY_MS)
+        self.render_timer.timeout.connect(self._show_sharp_page)
+        # Rendered pages and their links, kept across page turns and files
+        self.page_cache = PageCache(cache_budget)
+        self.prefetcher = PagePrefetcher(self.page_cache)
+        # Page in the view area, fitting its height, and its size in points
+        self.page_pixmap: QPixmap = None
+        self.page_rect: fitz.Rect = None
+        # Zoom relative to the page fitting the view, and the offset of the
+        # view into the zoomed page in logical pixels
+        self.zoom_factor = 1.0
+        self.pan = QPointF()
+        # Mouse position and pan when dragging the page started
+        self.drag_start = None
+        self.dragged = False
+        self.drag_distance = QApplication.startDragDistance()
+        # Tiles of zoomed pages, rendered from the display list of the page
+        self.tile_cache = PageCache(tile_cache_budget)
+        self.display_list = (None, None)  # (doc_key, page number), DisplayList
+        self.tile_timer = QTimer(self)
+        self.tile_timer.setSingleShot(True)
+        self.tile_timer.setInterval(TILE_DELAY_MS)
+        self.tile_timer.timeout.connect(self._render_missing)
+        # Continuous mode stacks all pages, rendering only those near the view
+        self.continuous = False
+        self.page_layout: ContinuousLayout = None
+        self.page_rects = (None, [])  # doc_key, size of each page in points
+        self.page_pixmaps = {}  # page number to QPixmap, of pages near the view
+        self.page_links = {}  # page number to LinkIndex, of pages near the view
+        # Links of the page shown, or of the page under the mouse
+        self.curr_page_links: LinkIndex = NO_LINKS
         # Keep track of which link on the page the mouse is hovering on
         self.curr_link_idx = -1
         self.cursor_normal = QCursor(Qt.CursorShape.ArrowCursor)
         self.cursor_pointing_hand = QCursor(Qt.CursorShape.PointingHandCursor)
         # ToolBar for navigation
         self.toolBar = self._create_tool_bar()
-        # QLabel to hold the QPixmap of PDF page
-        self.viewArea = QLabel(self)
-        self.viewArea.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        # Widget painting the page, its tiles when zoomed and its links
+        self.viewArea = QWidget(self)
         # Enable mouse tracking to know if it hovers on a link
         self.viewArea.setMouseTracking(True)
         # Override default events of the view area, not this widget itself
+        self.viewArea.paintEvent = self._paintEvent
+        self.viewArea.mousePressEvent = self._mousePressEvent
         self.viewArea.mouseMoveEvent = self._mouseMoveEvent
         self.viewArea.mouseReleaseEvent = self._mouseReleaseEvent
         self.viewArea.wheelEvent = self._wheelEvent
         layout = QVBoxLayout()
         layout.addWidget(self.toolBar)
-        layout.addWidget(self.viewArea)
+        # Scroll bar of continuous mode
+        self.scrollBar = QScrollBar(Qt.Orientation.Vertical, self)
+        self.scrollBar.setSingleStep(40)
+        self.scrollBar.valueChanged.connect(self._scrolled)
+        self.scrollBar.hide()
+        viewLayout = QHBoxLayout()
+        viewLayout.addWidget(self.viewArea)
+        viewLayout.addWidget(self.scrollBar)
+        layout.addLayout(viewLayout)
         container = QWidget(self)
         container.setLayout(layout)
         self.setWidget(container)
@@ -73,27 +162,329 @@ class PDFViewer(QDockWidget):
             self.show_pdf(self.curr_page)
         return super().resizeEvent(evt)
 
+    def _paintEvent(self, evt: QPaintEvent) -> None:
+        if self.continuous:
+            return self._paint_pages()
+        if self.page_pixmap is None:
+            return
+        painter = QPainter(self.viewArea)
+        scale = self.zoom_w * self.zoom_factor
+        origin = self._page_origin()
+        target = QRectF(
+            origin.x(),
+            origin.y(),
+            self.page_rect.width * scale,
+            self.page_rect.height * scale,
+        )
+        # The page fitting the view, scaled while tiles are missing
+        painter.drawPixmap(target, self.page_pixmap, QRectF(self.page_pixmap.rect()))
+        if self.zoom_factor > 1:
+            missing = False
+            for key, rect in self._visible_tiles(origin, scale):
+                image = self.tile_cache.get(key)
+                if image is None:
+                    missing = True
+                else:
+                    painter.drawImage(rect, image)
+            if missing:
+                self.tile_timer.start()
+        self._paint_links(painter, self.curr_page_links, origin, scale)
+        painter.end()
+
+    def _paint_links(self, painter: QPainter, links: LinkIndex, origin, scale) -> None:
+        """Print links onto the page at the origin in the view area"""
+        pen = QPen()
+        pen.setWidth(2)
+        pen.setColor(QColor(0, 255, 0, 155))
+        painter.setPen(pen)
+        for link in links.links:
+            r = link["from"]
+            painter.drawRect(
+                QRectF(
+                    origin.x() + r.x0 * scale,
+                    origin.y() + r.y0 * scale,
+                    r.width * scale,
+                    r.height * scale,
+                )
+            )
+
+    def _paint_pages(self) -> None:
+        """Paint the pages in view in continuous mode
+
+        Pages not yet rendered are left blank, or show the page cached at
+        another size, until input settles.
+        """
+        if self.page_layout is None:
+            return
+        painter = QPainter(self.viewArea)
+        layout = self.page_layout
+        top = self.scrollBar.value()
+        missing = False
+        for number in layout.pages_in(top, top + self.viewArea.height()):
+            rect = QRectF(
+                layout.left(number),
+                layout.tops[number] - top,
+                layout.rects[number].width * layout.scale,
+                layout.heights[number],
+            )
+            pixmap = self.page_pixmaps.get(number)
+            if pixmap is None:
+                missing = True
+                painter.fillRect(rect, Qt.GlobalColor.white)
+                image = self.page_cache.find(self.doc_key, number)
+                if image is not None:
+                    painter.drawImage(rect, image)
+                continue
+            painter.drawPixmap(rect, pixmap, QRectF(pixmap.rect()))
+            links = self.page_links.get(number, NO_LINKS)
+            self._paint_links(painter, links, rect.topLeft(), layout.scale)
+        painter.end()
+        if missing:
+            self.tile_timer.start()
+
+    def _render_missing(self) -> None:
+        if self.continuous:
+            self._render_pages()
+        else:
+            self._render_tiles()
+
+    def _render_pages(self) -> None:
+        """Render the pages near the view in continuous mode
+
+        Pages in view and one view above and below are kept as pixmaps, and
+        pages farther away are dropped. Pages are rendered through the page
+        cache, whose budget bounds the memory used by a long document.
+        """
+        if not self.doc or self.page_layout is None:
+            return
+        layout = self.page_layout
+        dpr = self.viewArea.devicePixelRatioF()
+        top = self.scrollBar.value()
+        height = self.viewArea.height()
+        near = layout.pages_in(top - height, top + 2 * height)
+        for number in list(self.page_pixmaps):
+            if number not in near:
+                del self.page_pixmaps[number]
+                self.page_links.pop(number, None)
+        visible = layout.pages_in(top, top + height)
+        for number in visible:
+            if number in self.page_pixmaps:
+                continue
+            page = self.doc[number]
+            page_height = round(layout.heights[number])
+            key = (self.doc_key, number, page_height, dpr)
+            image = self.page_cache.get(key)
+            if image is None:
+                image = render_page(page, fit_zoom(page.rect, page_height, dpr))
+                self.page_cache.put(key, image)
+            pixmap = QPixmap.fromImage(image)
+            pixmap.setDevicePixelRatio(dpr)
+            self.page_pixmaps[number] = pixmap
+            self.page_links[number] = self.page_cache.get_links(self.doc_key, page)
+        self.viewArea.update()
+        # Render the pages below while these are read
+        last = visible[-1]
+        self.prefetcher.prefetch(
+            self.doc_key,
+            last,
+            self.total_pages,
+            round(layout.heights[last]),
+            dpr,
+        )
+
+    def set_continuous(self, enabled: bool) -> None:
+        """Show all pages in a vertical scroll, or one page at a time"""
+        self.continuous = enabled
+        self.scrollBar.setVisible(enabled)
+        self.zoom_factor = 1.0
+        self.pan = QPointF()
+        self.page_layout = None
+        self.page_pixmaps.clear()
+        self.page_links.clear()
+        self.show_pdf(self.curr_page)
+        self.viewArea.update()
+
+    def _update_page_layout(self) -> None:
+        """Place all pages for the width of the view, if changed"""
+        width = self.viewArea.width()
+        if self.page_rects[0] != self.doc_key:
+            rects = [self.doc[number].rect for number in range(self.total_pages)]
+            self.page_rects = (self.doc_key, rects)
+            self.page_layout = None
+        if self.page_layout is None or self.page_layout.width != width:
+            self.page_layout = ContinuousLayout(self.page_rects[1], width)
+            self.page_pixmaps.clear()
+            self.page_links.clear()
+        self.scrollBar.setRange(
+            0, max(0, round(self.page_layout.height) - self.viewArea.height())
+        )
+        self.scrollBar.setPageStep(self.viewArea.height())
+
+    def _scrolled(self, value: int) -> None:
+        """Track the page at the top of the view in continuous mode"""
+        if not self.continuous or self.page_layout is None or self.document is None:
+            return
+        page_number = self.page_layout.page_at(value) + 1
+        self.curr_page = self.document.last_page = page_number
+        self._update_nav_info()
+        self.viewArea.update()
+
+    def _page_origin(self) -> QPointF:
+        """Position of the top left of the page in the view area
+
+        The page is centered along the directions it fits in the view, and
+        panned along the others.
+        """
+        scale = self.zoom_w * self.zoom_factor
+        width = self.page_rect.width * scale
+        height = self.page_rect.height * scale
+        x = (self.viewArea.width() - width) / 2
+        y = (self.viewArea.height() - height) / 2
+        return QPointF(
+            x if x >= 0 else -self.pan.x(),
+            y if y >= 0 else -self.pan.y(),
+        )
+
+    def _page_point(self, pos: QPointF) -> fitz.Point:
+        """Point of the page, in points, at the position in the view area"""
+        scale = self.zoom_w * self.zoom_factor
+        origin = self._page_origin()
+        return fitz.Point(
+            (pos.x() - origin.x()) / scale, (pos.y() - origin.y()) / scale
+        )
+
+    def _continuous_point(self, pos: QPointF) -> tuple:
+        """Links of the page at the position in continuous mode, and the
+        point of that page at the position, in points"""
+        layout = self.page_layout
+        if layout is None:
+            return NO_LINKS, None
+        y = self.scrollBar.value() + pos.y()
+        number = layout.page_at(y)
+        point = fitz.Point(
+            (pos.x() - layout.left(number)) / layout.scale,
+            (y - layout.tops[number]) / layout.scale,
+        )
+        return self.page_links.get(number, NO_LINKS), point
+
+    def _clamp_pan(self) -> None:
+        """Keep the view within the page"""
+        if self.page_rect is None:
+            return
+        scale = self.zoom_w * self.zoom_factor
+        width = self.page_rect.width * scale - self.viewArea.width()
+        height = self.page_rect.height * scale - self.viewArea.height()
+        self.pan = QPointF(
+            min(max(self.pan.x(), 0.0), max(width, 0.0)),
+            min(max(self.pan.y(), 0.0), max(height, 0.0)),
+        )
+
+    def _visible_tiles(self, origin: QPointF, scale: float) -> list:
+        """Get the tiles of the zoomed page intersecting the view area
+
+        Returns:
+            list: (key in tile cache, rectangle in the view area)
+        """
+        dpr = self.viewArea.devicePixelRatioF()
+        zoom = scale * dpr
+        width = self.page_rect.width * zoom
+        height = self.page_rect.height * zoom
+        # Part of the page in view, in device pixels from its top left
+        x0 = max(0.0, -origin.x() * dpr)
+        y0 = max(0.0, -origin.y() * dpr)
+        x1 = min(width, (self.viewArea.width() - origin.x()) * dpr)
+        y1 = min(height, (self.viewArea.height() - origin.y()) * dpr)
+        tiles = []
+        for j in range(int(y0 // TILE_SIZE), math.ceil(y1 / TILE_SIZE)):
+            for i in range(int(x0 // TILE_SIZE), math.ceil(x1 / TILE_SIZE)):
+                key = (self.doc_key, self.curr_page - 1, round(zoom, 3), i, j)
+                rect = QRectF(
+                    origin.x() + i * TILE_SIZE / dpr,
+                    origin.y() + j * TILE_SIZE / dpr,
+                    min(TILE_SIZE, width - i * TILE_SIZE) / dpr,
+                    min(TILE_SIZE, height - j * TILE_SIZE) / dpr,
+                )
+                tiles.append((key, rect))
+        return tiles
+
+    def _render_tiles(self) -> None:
+        """Render the tiles in view missing from the tile cache"""
+        if not self.doc or self.page_pixmap is None or self.zoom_factor <= 1:
+            return
+        page = (self.doc_key, self.curr_page - 1)
+        if self.display_list[0] != page:
+            self.display_list = (page, self.doc[page[1]].get_displaylist())
+        dl = self.display_list[1]
+        scale = self.zoom_w * self.zoom_factor
+        for key, _ in self._visible_tiles(self._page_origin(), scale):
+            if key in self.tile_cache:
+                continue
+            _, _, zoom, i, j = key
+            clip = fitz.Rect(i, j, i + 1, j + 1) * (TILE_SIZE / zoom)
+            self.tile_cache.put(key, render_page(dl, zoom, clip & self.page_rect))
+        self.viewArea.update()
+
+    def set_zoom(self, factor: float, anchor: QPointF = None) -> None:
+        """Zoom the page, keeping the point at the anchor in place
+
+        Args:
+            factor (float): zoom relative to the page fitting the view height,
+                from 1 to MAX_ZOOM
+            anchor (QPointF, optional): position in the view area. Defaults to
+                the center of the view area.
+        """
+        if self.page_rect is None or self.continuous:
+            return
+        if anchor is None:
+            anchor = QPointF(self.viewArea.width() / 2, self.viewArea.height() / 2)
+        point = self._page_point(anchor)
+        self.zoom_factor = min(max(factor, 1.0), MAX_ZOOM)
+        scale = self.zoom_w * self.zoom_factor
+        self.pan = QPointF(point.x * scale - anchor.x(), point.y * scale - anchor.y())
+        self._clamp_pan()
+        self.viewArea.update()
+
+    def _mousePressEvent(self, evt: QMouseEvent) -> None:
+        if evt.button() == Qt.MouseButton.LeftButton:
+            self.drag_start = (evt.position(), self.pan)
+            self.dragged = False
+        return super().mousePressEvent(evt)
+
     def _mouseMoveEvent(self, evt: QMouseEvent) -> None:
         pos = evt.position()
-        for idx, link in enumerate(self.curr_page_links):
-            # The Rectangle of the link
-            rectf: QRectF = link["from_qrectf"]
-            # Mouse in this rectangle
-            if rectf.contains(pos):
-                self.setCursor(self.cursor_pointing_hand)
-                self.curr_link_idx = idx
-                break
-        else:
-            # Mouse in none of the links
-            self.setCursor(self.cursor_normal)
-            self.curr_link_idx = -1
+        if self.drag_start is not None and not self.continuous:
+            # Drag the page if larger than the view
+            start, pan = self.drag_start
+            moved = pos - start
+            if self.dragged or moved.manhattanLength() > self.drag_distance:
+                self.pan = pan - moved
+                self.dragged = True
+                self._clamp_pan()
+                self.viewArea.update()
+                return super().mouseMoveEvent(evt)
+        # Only the mouse position is mapped to the page, in points
+        idx = -1
+        if self.continuous:
+            self.curr_page_links, point = self._continuous_point(pos)
+            if point is not None:
+                idx = self.curr_page_links.link_at(point)
+        elif self.page_rect is not None:
+            idx = self.curr_page_links.link_at(self._page_point(pos))
+        if idx != self.curr_link_idx:
+            cursor = self.cursor_normal if idx == -1 else self.cursor_pointing_hand
+            self.setCursor(cursor)
+            self.curr_link_idx = idx
         return super().mouseMoveEvent(evt)
 
     def _mouseReleaseEvent(self, evt: QMouseEvent) -> None:
+        dragged = self.dragged
+        self.drag_start = None
+        self.dragged = False
         # If click on a link, navigate to the page
-        if self.curr_link_idx != -1:
-            link = self.curr_page_links[self.curr_link_idx]
+        if self.curr_link_idx != -1 and not dragged:
+            link = self.curr_page_links.links[self.curr_link_idx]
             self.setCursor(self.cursor_normal)
+            self.curr_link_idx = -1
             if link["kind"] == fitz.LINK_URI:
                 url = QUrl(link["uri"])
                 QDesktopServices.openUrl(url)
@@ -107,8 +498,19 @@ class PDFViewer(QDockWidget):
 
     def _wheelEvent(self, evt: QWheelEvent) -> None:
         ang = evt.angleDelta()
-        delta = -1 + 2 * int(ang.y() < 0 == evt.inverted())
-        self.show_pdf(self.curr_page + delta)
+        if self.continuous:
+            self.scrollBar.setValue(self.scrollBar.value() - ang.y())
+        elif evt.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            step = ZOOM_STEP if ang.y() > 0 else 1 / ZOOM_STEP
+            self.set_zoom(self.zoom_factor * step, evt.position())
+        elif self.zoom_factor > 1:
+            # Scroll the zoomed page
+            self.pan -= QPointF(ang.x(), ang.y())
+            self._clamp_pan()
+            self.viewArea.update()
+        else:
+            delta = -1 + 2 * int(ang.y() < 0 == evt.inverted())
+            self.show_pdf(self.curr_page + delta)
         return super().wheelEvent(evt)
 
     def _create_tool_bar(self) -> QToolBar:
@@ -137,9 +539,33 @@ class PDFViewer(QDockWidget):
         )
         toolBar.addWidget(self.page_num_line_edit)
         toolBar.addWidget(self.lb_total_pages)
+        # Zoom
+        toolBar.addSeparator()
+        actionZoomOut = QAction("Zoom out", self)
+        actionZoomOut.setShortcut(QKeySequence.StandardKey.ZoomOut)
+        actionZoomOut.triggered.connect(
+            lambda: self.set_zoom(self.zoom_factor / ZOOM_STEP)
+        )
+        toolBar.addAction(actionZoomOut)
+        actionZoomIn = QAction("Zoom in", self)
+        actionZoomIn.setShortcut(QKeySequence.StandardKey.ZoomIn)
+        actionZoomIn.triggered.connect(
+            lambda: self.set_zoom(self.zoom_factor * ZOOM_STEP)
+        )
+        toolBar.addAction(actionZoomIn)
+        actionFit = QAction("Fit", self)
+        actionFit.triggered.connect(lambda: self.set_zoom(1.0))
+        toolBar.addAction(actionFit)
+        # Show all pages in a vertical scroll
+        actionContinuous = QAction("Continuous", self)
+        actionContinuous.setCheckable(True)
+        actionContinuous.toggled.connect(self.set_continuous)
+        toolBar.addAction(actionContinuous)
         return toolBar
 
     def show_pdf(self, page_number=1) -> None:
+        if not self.doc:
+            return
         if not page_number is int:
             try:
                 page_number = int(page_number)
@@ -147,79 +573,142 @@ class PDFViewer(QDockWidget):
                 return
         page_number = max(page_number, 1)
         page_number = min(page_number, self.total_pages)
-        self.curr_page = page_number
-        page_number -= 1
-        # First page of the loaded PDF file
-        dl = self.doc[page_number].get_displaylist()
-        # Get pixmap but scaled a bit to avoid blur
-        pix = self.doc.get_page_pixmap(page_number, matrix=fitz.Matrix(2, 2))
-        # Get the pixmap as byte array
-        data = QByteArray(pix.tobytes())
-        img = QImage()
-        img.loadFromData(data)
-
-        pixmap = QPixmap.fromImage(img)
-        del img
-
-        # Scale the image before the painting,
-        # but needs to note down the scale ratio (after/before)
-        pixmap_scaleRatio = self.viewArea.height() / pixmap.height()
-        pixmap = pixmap.scaledToHeight(
-            self.viewArea.height(), Qt.TransformationMode.SmoothTransformation
-        )
+        if page_number != self.curr_page:
+            # Start at the top of the next page
+            self.pan.setY(0)
+        self.curr_page = self.document.last_page = page_number
+        if self.continuous:
+            self._update_page_layout()
+            self.scrollBar.setValue(round(self.page_layout.tops[page_number - 1]))
+            self.curr_page = self.document.last_page = page_number
+        self._update_nav_info()
+        if self.continuous:
+            self.viewArea.update()
+        else:
+            self._show_page(sharp=False)
+
+    def _show_sharp_page(self) -> None:
+        if self.doc:
+            self._show_page(sharp=True)
 
-        # Print links onto the pixmap
+    def _show_page(self, sharp: bool) -> None:
+        """Show the current page, or a preview of it until input settles
+
+        Unless the page is cached at the size shown, a preview is shown at
+        once: the page shown before scaled to the new size, the page cached at
+        another size, or a render at low resolution. The page is rendered at
+        full resolution once no page turn or resize was requested for
+        RENDER_DELAY_MS, so a burst of wheel or resize events renders only the
+        last page requested.
+        """
+        page_number = self.curr_page - 1
+        page = self.doc[page_number]
+        # Render at the size shown, in device pixels to avoid blur
+        dpr = self.viewArea.devicePixelRatioF()
+        height = self.viewArea.height()
+        if height <= 0:
+            return
+        zoom = fit_zoom(page.rect, height, dpr)
+        key = (self.doc_key, page_number, height, dpr)
+        image = self.page_cache.get(key)
+        if image is not None or sharp:
+            self.render_timer.stop()
+            if image is None:
+                image = render_page(page, zoom)
+                self.page_cache.put(key, image)
+            pixmap = QPixmap.fromImage(image)
+        else:
+            self.render_timer.start()
+            pixmap = self._preview(page, zoom)
+            if pixmap.height() != round(height * dpr):
+                pixmap = pixmap.scaledToHeight(round(height * dpr))
+        pixmap.setDevicePixelRatio(dpr)
         if pixmap.isNull():
             return
-        painter = QPainter(pixmap)
-        pen = QPen()
-        pen.setWidth(2)
-        pen.setColor(QColor(0, 255, 0, 155))
-        painter.setPen(pen)
-        pg_ir: fitz.IRect = dl.rect.irect
-
-        pg_w = pg_ir.x1 - pg_ir.x0
-        pg_h = pg_ir.y1 - pg_ir.y0
-        self.zoom_w = pix.w / pg_w * pixmap_scaleRatio
-        self.zoom_h = pix.h / pg_h * pixmap_scaleRatio
-        self.curr_page_links = self.doc[page_number].get_links()
-        for i in range(len(self.curr_page_links)):
-            link = self.curr_page_links[i]
-            r = link["from"].irect
-            rect = QRectF(
-                r.x0 * self.zoom_w,
-                r.y0 * self.zoom_h,
-                r.width * self.zoom_w,
-                r.height * self.zoom_h,
-            )
-            link["from_qrectf"] = rect
-            painter.drawRect(rect)
-        painter.end()
+        self.page_pixmap = pixmap
+        self.page_rect = page.rect
+        # Logical pixels per point of the page fitting the view
+        self.zoom_w = self.zoom_h = zoom / dpr
+        if self.shown_page != (self.doc_key, page_number):
+            self.curr_link_idx = -1
+            self.setCursor(self.cursor_normal)
+        self.curr_page_links = self.page_cache.get_links(self.doc_key, page)
+        self._clamp_pan()
+        self.viewArea.update()
+        self.shown_page = (self.doc_key, page_number)
+        if self.render_timer.isActive():
+            return
+        # Render the next pages while this one is read
+        self.prefetcher.prefetch(
+            self.doc_key, page_number, self.total_pages, height, dpr
+        )
 
-        # Display the pixmap
-        self.viewArea.setPixmap(pixmap)
+    def _preview(self, page: fitz.Page, zoom: float) -> QPixmap:
+        if self.shown_page == (self.doc_key, page.number):
+            return self.page_pixmap
+        image = self.page_cache.find(self.doc_key, page.number)
+        if image is None:
+            image = render_page(page, zoom * PREVIEW_SCALE)
+        return QPixmap.fromImage(image)
 
-        # Update nav info
-        self._update_nav_info()
+    def load_file(self, filepath: str, display=False, page_number=None) -> None:
+        """Open the PDF file in the background, or reuse it if recently opened
 
-    def load_file(self, filepath: str, display=False) -> None:
+        Args:
+            filepath (str): path to PDF file
+            display (bool, optional): show a page once open. Defaults to False.
+            page_number (int, optional): page to show, 1 indexed. Defaults to
+                the page last shown of the file.
+        """
         if not filepath or "pdf" not in filepath.lower():
             return
-        else:
-            self.filepath = pathlib.Path(filepath).resolve().as_posix()
+        filepath = pathlib.Path(filepath).resolve().as_posix()
 
-        if not os.path.exists(self.filepath):
-            raise FileNotFoundError(f"Cannot load PDF: {self.filepath}")
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Cannot load PDF: {filepath}")
 
-        # Use PyMuPDF to load file
-        try:
-            self.doc = fitz.open(self.filepath)
-        except fitz.FileDataError:
+        document = self.documents.get(filepath)
+        if document is not None:
+            self.opener.cancel()
+            self._set_document(document, display, page_number)
             return
+        self.pending_display = (display, page_number)
+        self.opener.open(filepath)
+
+    def _document_ready(self, filepath: str, document: OpenDocument) -> None:
+        if document is None:
+            # Keep showing the previous file if this one cannot be opened,
+            # unless it is this file, changed and no longer readable
+            if self.document is not None and self.document.path == filepath:
+                self._clear_document()
+            return
+        self.documents.add(document)
+        self._set_document(document, *self.pending_display)
+
+    def _set_document(self, document: OpenDocument, display, page_number) -> None:
+        self.prefetcher.cancel()
+        self.document = document
+        self.documents.show(document)
+        self.filepath = document.path
+        self.doc = document.doc
+        self.doc_key = document.key
         self.total_pages = self.doc.page_count
+        self.curr_page = page_number or document.last_page
+        self.zoom_factor = 1.0
+        self.pan = QPointF()
         self._update_nav_info()
         if display:
-            self.show_pdf()
+            self.show_pdf(self.curr_page)
+
+    def get_page_cache_stats(self) -> PageCacheStats:
+        """Get hits, misses, evictions and memory use of rendered pages"""
+        with self.page_cache.lock:
+            return dataclasses.replace(self.page_cache.stats)
+
+    def get_tile_cache_stats(self) -> PageCacheStats:
+        """Get hits, misses, evictions and memory use of tiles of zoomed pages"""
+        with self.tile_cache.lock:
+            return dataclasses.replace(self.tile_cache.stats)
 
     def _update_nav_info(self):
         """Update navigation info"""
@@ -231,9 +720,31 @@ class PDFViewer(QDockWidget):
             self.page_num_line_edit.setText("")
         self.page_num_line_edit.clearFocus()
 
+    def _clear_document(self) -> None:
+        """Show no document, the shown one is released"""
+        self.prefetcher.cancel()
+        self.render_timer.stop()
+        self.tile_timer.stop()
+        self.documents.show(None)
+        self.document = self.doc = self.doc_key = None
+        self.total_pages = 0
+        self.curr_page = 1
+        self.page_pixmap = self.page_rect = None
+        self.display_list = (None, None)
+        self.curr_page_links = NO_LINKS
+        self.page_layout = None
+        self.page_rects = (None, [])
+        self.page_pixmaps.clear()
+        self.page_links.clear()
+        self.scrollBar.setRange(0, 0)
+        self._update_nav_info()
+        self.viewArea.update()
+
     def close_file(self) -> None:
-        if self.doc:
-            self.doc.close()
+        self._clear_document()
+        self.documents.close()
 
     def close(self) -> None:
+        self.opener.shutdown()
+        self.prefetcher.shutdown()
         self.close_file()
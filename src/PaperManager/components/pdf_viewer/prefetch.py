@@ -0,0 +1,98 @@
+import typing
+
+import fitz
+from PyQt6.QtCore import QRunnable, QThreadPool
+
+from .pagecache import PageCache
+from .render import fit_zoom, render_page
+
+# Pages rendered ahead of and behind the page shown
+PREFETCH_NEXT = 2
+PREFETCH_PREVIOUS = 1
+
+
+class RenderPageTask(QRunnable):
+    """Task to render a page into the page cache, unless cancelled since"""
+
+    def __init__(self, prefetcher: "PagePrefetcher", generation: int, key: tuple):
+        super().__init__()
+        self.prefetcher = prefetcher
+        self.generation = generation
+        self.key = key
+
+    def run(self):
+        if self.generation == self.prefetcher.generation:
+            self.prefetcher.render(self.key)
+
+
+class PagePrefetcher:
+    """Render the pages around the page shown in a background thread
+
+    Rendered pages are put into the page cache shared with the viewer, so the
+    next page is shown without rendering. Each call to `prefetch` cancels the
+    pages not yet rendered for the previous page shown. The worker thread
+    opens its own copy of the document, as a document cannot be used by two
+    threads at once.
+
+    Args:
+        cache (PageCache): cache of rendered pages
+    """
+
+    def __init__(self, cache: PageCache) -> None:
+        self.cache = cache
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.generation = 0
+        # Document used by the worker thread only
+        self.document: typing.Optional[tuple] = None
+        self.doc: typing.Optional[fitz.Document] = None
+
+    def prefetch(
+        self, document: tuple, page_number: int, page_count: int, height, dpr
+    ) -> None:
+        """Render the neighbours of the page, nearest next pages first
+
+        Args:
+            document (tuple): path and modification time of the document
+            page_number (int): page shown, 0 indexed
+            page_count (int): number of pages of the document
+            height (int): height of the view in logical pixels
+            dpr (float): device pixel ratio of the view
+        """
+        self.cancel()
+        numbers = [page_number + i for i in range(1, PREFETCH_NEXT + 1)]
+        numbers += [page_number - i for i in range(1, PREFETCH_PREVIOUS + 1)]
+        for number in numbers:
+            key = (document, number, height, dpr)
+            if 0 <= number < page_count and key not in self.cache:
+                self.pool.start(RenderPageTask(self, self.generation, key))
+
+    def cancel(self) -> None:
+        """Drop pages waiting to be rendered"""
+        self.generation += 1
+        self.pool.clear()
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self.pool.waitForDone()
+        if self.doc is not None:
+            self.doc.close()
+            self.doc = None
+
+    def render(self, key: tuple) -> None:
+        document, number, height, dpr = key
+        if key in self.cache:
+            return
+        if self.document != document:
+            if self.doc is not None:
+                self.doc.close()
+            self.doc, self.document = None, document
+            try:
+                self.doc = fitz.open(document[0])
+            except Exception:
+                return
+        if self.doc is None:
+            return
+        page = self.doc[number]
+        self.cache.put(key, render_page(page, fit_zoom(page.rect, height, dpr)))
+        self.cache.get_links(document, page)
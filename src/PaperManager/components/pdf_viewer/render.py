@@ -0,0 +1,45 @@
+import typing
+
+import fitz
+from PyQt6.QtGui import QImage
+
+
+def fit_zoom(page_rect: fitz.Rect, height: float, dpr: float = 1.0) -> float:
+    """Device pixels per point to show the page at the height
+
+    Args:
+        page_rect (fitz.Rect): page size in points
+        height (float): height of the view in logical pixels
+        dpr (float, optional): device pixel ratio of the view. Defaults to 1.0.
+    """
+    return height * dpr / page_rect.height
+
+
+def render_page(
+    page: typing.Union[fitz.Page, fitz.DisplayList],
+    zoom: float,
+    clip: typing.Optional[fitz.Rect] = None,
+) -> QImage:
+    """Render the page, or the clip of it, at the zoom in device pixels
+
+    The image is rendered at exactly the size it is shown and wraps the
+    samples of the rendered pixmap, without encoding or copying them. The
+    pixmap is kept alive by the image.
+
+    Args:
+        page (typing.Union[fitz.Page, fitz.DisplayList]): page, or its
+            display list to render several clips without parsing it again
+        zoom (float): device pixels per point
+        clip (typing.Optional[fitz.Rect], optional): area of the page in
+            points. Defaults to None, the whole page.
+
+    Returns:
+        QImage: image in RGB888
+    """
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+    image = QImage(
+        pix.samples_mv, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888
+    )
+    # QImage does not own memory it wraps
+    image.samples = pix
+    return image
@@ -0,0 +1,59 @@
+from PyQt6.QtWidgets import QDockWidget, QTreeView, QLineEdit, QVBoxLayout, QWidget
+from PyQt6.QtGui import QStandardItem, QStandardItemModel
+from PyQt6.QtCore import Qt, QModelIndex
+
+from ..database import PMDatabase
+from ..signals import PMCommunicate
+
+# Roles of the first column holding where to open a hit
+PathRole = Qt.ItemDataRole.UserRole
+PageRole = Qt.ItemDataRole.UserRole + 1
+
+
+class SearchViewer(QDockWidget):
+    """Full-text search of the library, a hit opens the pdf at its page"""
+
+    def __init__(self, parent, comm: PMCommunicate, db: PMDatabase, *args, **kwargs):
+        super().__init__("Search", parent, *args, **kwargs)
+        self.comm = comm
+        self.db = db
+        self.setAllowedAreas(Qt.DockWidgetArea.AllDockWidgetAreas)
+        self.setFeatures(
+            QDockWidget.DockWidgetFeature.DockWidgetMovable
+            | QDockWidget.DockWidgetFeature.DockWidgetFloatable
+            | QDockWidget.DockWidgetFeature.DockWidgetClosable
+        )
+        self.line_edit = QLineEdit(self)
+        self.line_edit.setPlaceholderText("Search the text of papers...")
+        self.line_edit.setClearButtonEnabled(True)
+        self.line_edit.returnPressed.connect(self.search)
+        self.model = QStandardItemModel(self)
+        self.model.setHorizontalHeaderLabels(["Paper", "Page", "Text"])
+        self.view = QTreeView(self)
+        self.view.setModel(self.model)
+        self.view.setRootIsDecorated(False)
+        self.view.setAlternatingRowColors(True)
+        self.view.setEditTriggers(QTreeView.EditTrigger.NoEditTriggers)
+        self.view.activated.connect(self.open_hit)
+        self.view.clicked.connect(self.open_hit)
+        self.w = QWidget(self)
+        self.w.setLayout(QVBoxLayout(self.w))
+        self.w.layout().addWidget(self.line_edit)
+        self.w.layout().addWidget(self.view)
+        self.setWidget(self.w)
+
+    def search(self):
+        self.model.removeRows(0, self.model.rowCount())
+        for hit in self.db.search_text(self.line_edit.text()):
+            name = QStandardItem(hit.name)
+            name.setData(hit.path, PathRole)
+            name.setData(hit.page, PageRole)
+            name.setToolTip(hit.path)
+            page = QStandardItem(str(hit.page))
+            # Snippets span lines of the page
+            snippet = QStandardItem(" ".join(hit.snippet.split()))
+            self.model.appendRow([name, page, snippet])
+
+    def open_hit(self, index: QModelIndex):
+        item = self.model.item(index.row(), 0)
+        self.comm.open_pdf_page.emit(item.data(PathRole), item.data(PageRole))
@@ -5,6 +5,20 @@ class PMCommunicate(QObject):
     """Communication signals"""
 
     open_pdf = pyqtSignal(str, name="open pdf")
+    open_pdf_page = pyqtSignal(str, int, name="open pdf at page")
     update_directory_done = pyqtSignal(str, name="pdfs in directory added to database")
-    tags_updated = pyqtSignal(name="tags updated")
+    update_directory_stats = pyqtSignal(
+        str, int, float, name="number of pdfs added and files per second"
+    )
+    update_directory_failed = pyqtSignal(
+        str, str, name="changes in directory not written to database and error"
+    )
+    library_updated = pyqtSignal(list, list, name="pdfs added and removed")
+    text_index_progress = pyqtSignal(
+        int, int, name="number of pdfs whose text is indexed and to index"
+    )
+    paper_tags_changed = pyqtSignal(list, name="paperIds whose tags changed")
+    tag_counts_changed = pyqtSignal(dict, name="tag name to change in count")
+    tag_query_changed = pyqtSignal(object, name="paperIds matching tag query or None")
+    directory_selected = pyqtSignal(str, name="directory shown in file system")
     pdf_selected = pyqtSignal(bool, name="a pdf file is selected")
@@ -0,0 +1,415 @@
+import re
+import sys
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# Rough memory cost of a cached path and of a tag given to a paper, in bytes
+PATH_OVERHEAD_BYTES = 200
+TAG_MEMBERSHIP_BYTES = 64
+
+
+def iter_bits(bits: int) -> typing.Iterator[int]:
+    """Positions of the bits set in a bitset, lowest first"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+# Positions of the bits set in each byte value
+_BYTE_BITS = [tuple(i for i in range(8) if byte >> i & 1) for byte in range(256)]
+_NONZERO_BYTES = re.compile(rb"[^\x00]+")
+
+
+def set_bit(bitmap: bytearray, i: int) -> bool:
+    """Set a bit of a bitmap, growing it if needed
+
+    Returns:
+        bool: True if the bit was not set
+    """
+    byte = i >> 3
+    if byte >= len(bitmap):
+        bitmap.extend(bytes(byte + 1 - len(bitmap)))
+    mask = 1 << (i & 7)
+    if bitmap[byte] & mask:
+        return False
+    bitmap[byte] |= mask
+    return True
+
+
+def clear_bit(bitmap: bytearray, i: int) -> bool:
+    """Clear a bit of a bitmap
+
+    Returns:
+        bool: True if the bit was set
+    """
+    byte = i >> 3
+    mask = 1 << (i & 7)
+    if byte >= len(bitmap) or not bitmap[byte] & mask:
+        return False
+    bitmap[byte] &= ~mask & 0xFF
+    return True
+
+
+def bitmap_ids(bits: int) -> list:
+    """Positions of the bits set in a large bitmap, in increasing order"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    ids = []
+    # Skip runs of zero bytes in C
+    for run in _NONZERO_BYTES.finditer(data):
+        base = run.start() << 3
+        for byte in run.group():
+            if byte == 0xFF:
+                ids.extend(range(base, base + 8))
+            else:
+                ids.extend([base + i for i in _BYTE_BITS[byte]])
+            base += 8
+    return ids
+
+
+class PaperRecord:
+    """Locations and tags of a paper in memory
+
+    Tags are a bitset over tag ids, so that a paper with a few tags costs a
+    single small int, and comparing or combining tags of papers is a bitwise
+    operation. Most papers have one location, kept as a string instead of a
+    tuple of strings.
+    """
+
+    __slots__ = ("paths", "tags", "names")
+
+    def __init__(self) -> None:
+        self.paths: typing.Union[str, tuple] = ()
+        self.tags = 0
+        # Sorted tuple of tag names, cached until the tags change
+        self.names: typing.Optional[tuple] = None
+
+
+class TagIndex:
+    """In-memory indexes between paths, papers and tags
+
+    Maps path to paper, paper to its record of paths and tags, tag to the
+    bitmap of its papers and tag name to id both ways. Every lookup and update
+    takes constant time, or time proportional to the number of tags of the
+    paper concerned. Tag bitmaps are mutable bytearrays, so tagging a paper
+    does not copy them. Tag names are interned once and mapped to small
+    integer ids assigned in memory; tags are written to database by name.
+
+    Tags given to a path not yet in database are kept until the path is added.
+    """
+
+    def __init__(self) -> None:
+        self.path_paper = {}  # path to paperId
+        self.papers = {}  # paperId to PaperRecord
+        self.tag_papers = []  # tag id to bytearray bitmap over paperIds
+        self.tag_counts = []  # tag id to number of papers
+        self.tag_ids = {}  # tag name to tag id
+        self.tag_names = []  # tag id to tag name
+        self.pending = {}  # path not yet in database to set of tag names
+        # Bitmap over paperIds of papers with a location
+        self.library = bytearray()
+
+    # ================================ Tags ================================
+
+    def tag_id(self, name: str) -> int:
+        """Get the id of the tag, added if new"""
+        tagId = self.tag_ids.get(name)
+        if tagId is None:
+            name = sys.intern(name)
+            tagId = len(self.tag_names)
+            self.tag_ids[name] = tagId
+            self.tag_names.append(name)
+            self.tag_papers.append(bytearray())
+            self.tag_counts.append(0)
+        return tagId
+
+    def used_tag_names(self) -> list:
+        """Get the names of tags given to at least one paper"""
+        return [name for name, n in zip(self.tag_names, self.tag_counts) if n]
+
+    def tag_counts_by_name(self) -> dict:
+        """Get the number of papers with each tag in use"""
+        return {name: n for name, n in zip(self.tag_names, self.tag_counts) if n}
+
+    def recount(self) -> None:
+        """Count again the papers in the bitmap of each tag"""
+        self.tag_counts = [
+            bin(int.from_bytes(bitmap, "little")).count("1")
+            for bitmap in self.tag_papers
+        ]
+
+    def papers_with(self, name: str) -> int:
+        """Get the papers with the tag as a bitmap over paperIds"""
+        tagId = self.tag_ids.get(name)
+        if tagId is None:
+            return 0
+        return int.from_bytes(self.tag_papers[tagId], "little")
+
+    def library_papers(self) -> int:
+        """Get the papers with a location as a bitmap over paperIds"""
+        return int.from_bytes(self.library, "little")
+
+    def mark_tag(self, paperId: int, name: str) -> None:
+        """Record in the tag bitmap a paper whose record is not in memory"""
+        self._set_paper_bit(self.tag_id(name), paperId)
+
+    def mark_paper(self, paperId: int) -> None:
+        """Record in the library bitmap a paper whose record is not in memory"""
+        set_bit(self.library, paperId)
+
+    def copy_tag_bits(self, src: int, dst: int) -> None:
+        """Give the tags of one paper to another, in the tag bitmaps only"""
+        byte, mask = src >> 3, 1 << (src & 7)
+        for tagId, bitmap in enumerate(self.tag_papers):
+            if byte < len(bitmap) and bitmap[byte] & mask:
+                self._set_paper_bit(tagId, dst)
+
+    def _set_paper_bit(self, tagId: int, paperId: int) -> None:
+        if set_bit(self.tag_papers[tagId], paperId):
+            self.tag_counts[tagId] += 1
+
+    def _clear_paper_bit(self, tagId: int, paperId: int) -> None:
+        if clear_bit(self.tag_papers[tagId], paperId):
+            self.tag_counts[tagId] -= 1
+
+    # =============================== Papers ===============================
+
+    def paper_of(self, path: str) -> typing.Optional[int]:
+        return self.path_paper.get(path)
+
+    def has_paper(self, paperId: int) -> bool:
+        return paperId in self.papers
+
+    def tags_of(self, path: str) -> tuple:
+        """Get the sorted names of tags of the paper at the path
+
+        The sorted tuple is cached per paper until the paper's tags change.
+        """
+        paperId = self.path_paper.get(path)
+        if paperId is None:
+            return tuple(sorted(self.pending.get(path, ())))
+        return self.names_of(paperId)
+
+    def names_of(self, paperId: int) -> tuple:
+        """Get the sorted names of tags of the paper
+
+        Papers without a record in memory are looked up in the tag bitmaps.
+        """
+        record = self.papers.get(paperId)
+        if record is None:
+            names = (self.tag_names[i] for i in iter_bits(self._bitmap_tags(paperId)))
+            return tuple(sorted(names))
+        if record.names is None:
+            names = (self.tag_names[i] for i in iter_bits(record.tags))
+            record.names = tuple(sorted(names))
+        return record.names
+
+    def _bitmap_tags(self, paperId: int) -> int:
+        """Get the tags of a paper in the tag bitmaps as a bitset over tag ids"""
+        byte, mask = paperId >> 3, 1 << (paperId & 7)
+        tags = 0
+        for tagId, bitmap in enumerate(self.tag_papers):
+            if byte < len(bitmap) and bitmap[byte] & mask:
+                tags |= 1 << tagId
+        return tags
+
+    def tag_bits_of(self, paperId: int) -> int:
+        """Get the tags of the paper as a bitset over tag ids"""
+        record = self.papers.get(paperId)
+        return record.tags if record is not None else 0
+
+    def add_tag(self, paperId: int, name: str) -> bool:
+        """Tag the paper
+
+        Returns:
+            bool: True if the paper did not have the tag
+        """
+        tagId = self.tag_id(name)
+        record = self.papers.get(paperId)
+        if record is None:
+            record = self.papers[paperId] = PaperRecord()
+        bit = 1 << tagId
+        if record.tags & bit:
+            return False
+        record.tags |= bit
+        record.names = None
+        self._set_paper_bit(tagId, paperId)
+        return True
+
+    def remove_tag(self, paperId: int, name: str) -> bool:
+        """Untag the paper
+
+        Returns:
+            bool: True if the paper had the tag
+        """
+        tagId = self.tag_ids.get(name)
+        record = self.papers.get(paperId)
+        if tagId is None or record is None or not record.tags >> tagId & 1:
+            return False
+        record.tags &= ~(1 << tagId)
+        record.names = None
+        self._clear_paper_bit(tagId, paperId)
+        return True
+
+    def copy_tags(self, src: int, dst: int) -> None:
+        """Give the tags of one paper to another"""
+        for tagId in iter_bits(self.tag_bits_of(src)):
+            self.add_tag(dst, self.tag_names[tagId])
+
+    # ================================ Paths ===============================
+
+    def add_path(self, paperId: int, path: str) -> list:
+        """Record a location of the paper
+
+        Returns:
+            list: names of tags given to the path before it was in database
+        """
+        prevId = self.path_paper.get(path)
+        if prevId == paperId:
+            return []
+        if prevId is not None:
+            self.remove_path(path)
+        self.path_paper[path] = paperId
+        set_bit(self.library, paperId)
+        record = self.papers.get(paperId)
+        if record is None:
+            record = self.papers[paperId] = PaperRecord()
+            # Tags of a paper not in memory are kept in the tag bitmaps
+            record.tags = self._bitmap_tags(paperId)
+        if not record.paths:
+            record.paths = path
+        elif isinstance(record.paths, str):
+            record.paths = (record.paths, path)
+        else:
+            record.paths += (path,)
+        return list(self.pending.pop(path, ()))
+
+    def _detach(self, paperId: int, path: str) -> typing.Optional[PaperRecord]:
+        """Remove a location from the paper's record
+
+        Returns:
+            typing.Optional[PaperRecord]: record, if the paper has no location
+                left and was dropped
+        """
+        record = self.papers.get(paperId)
+        if record is None:
+            return None
+        if isinstance(record.paths, str):
+            record.paths = () if record.paths == path else record.paths
+        else:
+            paths = tuple(p for p in record.paths if p != path)
+            record.paths = paths[0] if len(paths) == 1 else paths
+        if record.paths:
+            return None
+        return self.papers.pop(paperId)
+
+    def evict_path(self, path: str) -> None:
+        """Drop a path from memory, and the record of its paper if not needed
+
+        Unlike `remove_path`, the paper stays in the library and tag bitmaps,
+        and tags given to the path before it was in database are kept, as they
+        are not written yet.
+        """
+        paperId = self.path_paper.pop(path, None)
+        if paperId is not None:
+            self._detach(paperId, path)
+
+    def remove_path(self, path: str) -> None:
+        """Forget a path removed from the library
+
+        The tags of the paper are kept, for its other or future locations.
+        """
+        paperId = self.path_paper.pop(path, None)
+        self.pending.pop(path, None)
+        if paperId is None:
+            return
+        record = self._detach(paperId, path)
+        if record is not None:
+            clear_bit(self.library, paperId)
+            if record.tags:
+                # Kept tagged without location, as in database
+                self.papers[paperId] = record
+
+    def add_pending_tag(self, path: str, name: str) -> bool:
+        """Tag a path not yet in database
+
+        Returns:
+            bool: True if the path did not have the tag
+        """
+        tags = self.pending.setdefault(path, set())
+        if name in tags:
+            return False
+        tags.add(name)
+        return True
+
+    def remove_pending_tag(self, path: str, name: str) -> None:
+        self.pending.get(path, set()).discard(name)
+
+
+@dataclass
+class TagCacheStats:
+    """Statistics of the directories loaded in a lazy tag cache"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    directories: int = 0
+    bytes: int = 0
+    budget: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class DirectoryLRU:
+    """Directories whose papers and tags are in memory, least recently used first
+
+    Args:
+        budget (int): approximate memory budget in bytes
+    """
+
+    def __init__(self, budget: int) -> None:
+        self.dirs = OrderedDict()  # directory to (set of paths, size in bytes)
+        self.stats = TagCacheStats(budget=budget)
+
+    def lookup(self, directory: str) -> bool:
+        """Check if the directory is loaded, marking it as recently used"""
+        if directory in self.dirs:
+            self.dirs.move_to_end(directory)
+            self.stats.hits += 1
+            return True
+        self.stats.misses += 1
+        return False
+
+    def __contains__(self, directory: str) -> bool:
+        return directory in self.dirs
+
+    def add(self, directory: str, paths: set, size: int) -> list:
+        """Record a loaded directory
+
+        Returns:
+            list: paths of least recently used directories evicted to stay
+                within the budget
+        """
+        self.dirs[directory] = (paths, size)
+        self.stats.bytes += size
+        evicted = []
+        while self.stats.bytes > self.stats.budget and len(self.dirs) > 1:
+            _, (paths, size) = self.dirs.popitem(last=False)
+            self.stats.bytes -= size
+            self.stats.evictions += 1
+            evicted.extend(paths)
+        self.stats.directories = len(self.dirs)
+        return evicted
+
+    def add_path(self, directory: str, path: str) -> None:
+        """Record a new path in a loaded directory"""
+        paths, size = self.dirs[directory]
+        if path not in paths:
+            paths.add(path)
+            pathSize = sys.getsizeof(path) + PATH_OVERHEAD_BYTES
+            self.dirs[directory] = (paths, size + pathSize)
+            self.stats.bytes += pathSize
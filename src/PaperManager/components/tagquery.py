@@ -0,0 +1,158 @@
+import re
+import typing
+
+# A tag name, or a quoted one to use spaces, parentheses or operators in it
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+class TagQueryError(ValueError):
+    """Invalid tag query, with the position of the error in the query"""
+
+    def __init__(self, message: str, position: int) -> None:
+        super().__init__(f"{message} at position {position}")
+        self.position = position
+
+
+def _tokenize(text: str) -> list:
+    """Split the query into (kind, value, position) tokens"""
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            raise TagQueryError("Unterminated quote", pos)
+        opening, closing, quoted, word = match.groups()
+        start = match.start(match.lastindex)
+        if opening:
+            tokens.append(("(", opening, start))
+        elif closing:
+            tokens.append((")", closing, start))
+        elif quoted is not None:
+            tokens.append(("tag", quoted, start))
+        elif word.upper() in _OPERATORS:
+            tokens.append((word.upper(), word, start))
+        else:
+            tokens.append(("tag", word, start))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser of tag queries
+
+    query := or
+    or    := and ("OR" and)*
+    and   := not (["AND"] not)*
+    not   := "NOT" not | "(" or ")" | tag
+    """
+
+    def __init__(self, text: str) -> None:
+        self.tokens = _tokenize(text)
+        self.end = len(text)
+        self.i = 0
+
+    def peek(self) -> typing.Optional[str]:
+        return self.tokens[self.i][0] if self.i < len(self.tokens) else None
+
+    def take(self) -> tuple:
+        if self.i >= len(self.tokens):
+            raise TagQueryError("Unexpected end of query", self.end)
+        token = self.tokens[self.i]
+        self.i += 1
+        return token
+
+    def parse(self) -> tuple:
+        if not self.tokens:
+            raise TagQueryError("Empty query", 0)
+        node = self.parse_or()
+        if self.i < len(self.tokens):
+            _, value, pos = self.tokens[self.i]
+            raise TagQueryError(f"Unexpected {value!r}", pos)
+        return node
+
+    def parse_or(self) -> tuple:
+        nodes = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and(self) -> tuple:
+        nodes = [self.parse_not()]
+        while self.peek() in ("AND", "NOT", "(", "tag"):
+            if self.peek() == "AND":
+                self.take()
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not(self) -> tuple:
+        kind, value, pos = self.take()
+        if kind == "NOT":
+            return ("not", self.parse_not())
+        if kind == "(":
+            node = self.parse_or()
+            kind, value, pos = self.take()
+            if kind != ")":
+                raise TagQueryError("Expected ')'", pos)
+            return node
+        if kind == "tag":
+            return ("tag", value)
+        raise TagQueryError(f"Unexpected {value!r}", pos)
+
+
+def parse(text: str) -> tuple:
+    """Parse a boolean tag query such as `ml AND (survey OR review) NOT read`
+
+    Operators are AND, OR and NOT in any case, AND binding tighter than OR.
+    Tags next to each other are joined with AND. A tag named like an operator
+    or containing spaces or parentheses is quoted in double quotes.
+
+    Args:
+        text (str): query
+
+    Raises:
+        TagQueryError: if the query is invalid
+
+    Returns:
+        tuple: syntax tree of ("tag", name), ("not", node), ("and", [nodes])
+            and ("or", [nodes])
+    """
+    return _Parser(text).parse()
+
+
+def evaluate(
+    node: tuple, papers_with: typing.Callable[[str], int], universe: int
+) -> int:
+    """Evaluate a query over bitmaps of papers
+
+    Args:
+        node (tuple): syntax tree from `parse`
+        papers_with (typing.Callable[[str], int]): bitmap of papers with a tag
+        universe (int): bitmap of all papers, complemented by NOT
+
+    Returns:
+        int: bitmap of papers matching the query
+    """
+    kind, value = node
+    if kind == "tag":
+        return papers_with(value) & universe
+    if kind == "not":
+        return universe & ~evaluate(value, papers_with, universe)
+    if kind == "and":
+        # Intersect the positive terms first, complements only shrink them
+        positive = [child for child in value if child[0] != "not"]
+        negative = [child[1] for child in value if child[0] == "not"]
+        result = universe
+        for child in positive:
+            result &= evaluate(child, papers_with, universe)
+            if not result:
+                return 0
+        for child in negative:
+            result &= ~evaluate(child, papers_with, universe)
+        return result
+    result = 0
+    for child in value:
+        result |= evaluate(child, papers_with, universe)
+    return result
@@ -1,9 +1,16 @@
+import time
+import threading
 from dataclasses import dataclass
+from concurrent.futures.process import BrokenProcessPool
 
 from PyQt6.QtCore import QRunnable
 
 from .signals import PMCommunicate
 from .database import PMDatabase
+from . import fulltext
+
+# Minimum interval between two reports of progress of text indexing
+PROGRESS_INTERVAL_SEC = 0.5
 
 
 class PMTask(QRunnable):
@@ -28,6 +35,94 @@ class PMUpdateDirectory(PMTask):
     directory_path: str
 
     def run(self):
-        self.db.update_dir(self.directory_path)
+        try:
+            stats = self.db.update_dir(self.directory_path)
+        finally:
+            self.db.release_connection()
         # Emit signal on completion
+        self.comm.update_directory_stats.emit(
+            self.directory_path, stats.files, stats.files_per_sec
+        )
+        if stats.errors:
+            self.comm.update_directory_failed.emit(
+                self.directory_path, stats.errors[-1]
+            )
+        if stats.changed:
+            self.comm.library_updated.emit(stats.added, stats.removed)
         self.comm.update_directory_done.emit(self.directory_path)
+
+
+@dataclass
+class PMIndexDirectories(PMTask):
+    """Task to index changes in the given directories reported by a watcher
+
+    Args:
+        comm (FTCommunicate): communication
+        db (PMDatabase): database
+        directory_paths (list): resolved directories that changed
+    """
+
+    comm: PMCommunicate
+    db: PMDatabase
+    directory_paths: list
+
+    def run(self):
+        try:
+            stats = self.db.update_dirs(self.directory_paths)
+        finally:
+            self.db.release_connection()
+        if stats.errors:
+            for path in self.directory_paths:
+                self.comm.update_directory_failed.emit(path, stats.errors[-1])
+        if stats.changed:
+            self.comm.library_updated.emit(stats.added, stats.removed)
+
+
+@dataclass
+class PMIndexFullText(PMTask):
+    """Task to extract and index the text of pdfs not yet indexed
+
+    Each pdf is written once extracted, so the task can be stopped at any time
+    and is resumed by running it again.
+
+    Args:
+        comm (FTCommunicate): communication
+        db (PMDatabase): database
+        stop (threading.Event): set to stop the task
+    """
+
+    comm: PMCommunicate
+    db: PMDatabase
+    stop: threading.Event
+
+    def run(self):
+        attempted = set()
+        try:
+            # Pdfs may be added while indexing
+            while not self.stop.is_set() and self._index_pending(attempted):
+                pass
+        finally:
+            self.db.release_connection()
+
+    def _index_pending(self, attempted: set) -> int:
+        items = [i for i in self.db.get_unindexed_texts() if i[1] not in attempted]
+        attempted.update(item[1] for item in items)
+        written = None
+        lastReport = 0.0
+        try:
+            for done, (item, pages) in enumerate(
+                fulltext.extract_texts(items, self.stop), start=1
+            ):
+                written = self.db.set_page_texts(item, pages)
+                if time.monotonic() - lastReport > PROGRESS_INTERVAL_SEC:
+                    lastReport = time.monotonic()
+                    self.comm.text_index_progress.emit(done, len(items))
+        except BrokenProcessPool:
+            # A worker died, e.g. on a malformed pdf. The pdfs not written
+            # are extracted again the next time the task runs.
+            pass
+        if written is not None:
+            written.result()
+        if items:
+            self.comm.text_index_progress.emit(len(items), len(items))
+        return len(items)
@@ -0,0 +1,232 @@
+import os
+import typing
+import posixpath
+from collections import OrderedDict
+
+from PyQt6.QtWidgets import (
+    QDockWidget,
+    QListView,
+    QComboBox,
+    QVBoxLayout,
+    QWidget,
+)
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize
+
+from ..database import PMDatabase
+from ..signals import PMCommunicate
+from ..thumbnails import ThumbnailStore, ThumbnailLoader, THUMBNAIL_HEIGHT
+
+# Number of decoded thumbnails kept in memory
+PIXMAP_CACHE_SIZE = 512
+THUMBNAIL_WIDTH = THUMBNAIL_HEIGHT * 3 // 4
+# Sources of the pdfs shown
+FOLDER, PAPERS = "Current folder", "Papers"
+
+PathRole = Qt.ItemDataRole.UserRole
+
+
+class ThumbnailModel(QAbstractListModel):
+    """Pdfs shown with the thumbnail of their first page
+
+    The key of a thumbnail is read in the background when its row is first
+    shown, from the prefilter hash known to database and the modification
+    time of the pdf. Thumbnails in the store are read without opening the
+    pdf, missing ones are rendered in the background and shown once ready.
+    """
+
+    def __init__(self, parent, store: ThumbnailStore) -> None:
+        super().__init__(parent)
+        self.store = store
+        self.loader = ThumbnailLoader(store, self)
+        self.loader.ready.connect(self.update_thumbnail)
+        self.loader.keyed.connect(self.set_key)
+        self.items = []  # (name, path, prehash or None)
+        self.path_rows = {}  # path to row
+        self.keys = {}  # path to key of thumbnail, or None if unreadable
+        self.keying = set()  # paths whose key is being read
+        self.rows = {}  # key of thumbnail to rows
+        self.pixmaps = OrderedDict()  # key to pixmap, least recent first
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.items)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        name, path, _ = self.items[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return name
+        if role == Qt.ItemDataRole.ToolTipRole or role == PathRole:
+            return path
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.thumbnail(index.row())
+        return None
+
+    def set_items(self, items: list) -> None:
+        """Show these (name, path, prehash) items"""
+        if items == self.items:
+            return
+        self.loader.cancel()
+        self.beginResetModel()
+        self.items = items
+        self.path_rows = {path: row for row, (_, path, _) in enumerate(items)}
+        self.keys.clear()
+        self.keying.clear()
+        self.rows.clear()
+        self.endResetModel()
+
+    def set_key(self, path: str, key: typing.Optional[bytes]) -> None:
+        row = self.path_rows.get(path)
+        # Requested before the items shown were replaced
+        if row is None or path in self.keys:
+            return
+        self.keys[path] = key
+        self.keying.discard(path)
+        if key is not None:
+            self.rows.setdefault(key, []).append(row)
+            self.update_thumbnail(key)
+
+    def thumbnail(self, row: int) -> typing.Optional[QPixmap]:
+        _, path, prehash = self.items[row]
+        if path not in self.keys:
+            if path not in self.keying:
+                self.keying.add(path)
+                self.loader.request_key(path, prehash)
+            return None
+        key = self.keys[path]
+        if key is None:
+            return None
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+            return pixmap
+        image = self.store.get(key)
+        if image is None:
+            self.loader.request(key, self.items[row][1])
+            return None
+        if not image:
+            # The pdf cannot be read
+            return None
+        pixmap = QPixmap.fromImage(QImage.fromData(image))
+        self.pixmaps[key] = pixmap
+        if len(self.pixmaps) > PIXMAP_CACHE_SIZE:
+            self.pixmaps.popitem(last=False)
+        return pixmap
+
+    def update_thumbnail(self, key: bytes) -> None:
+        for row in self.rows.get(key, ()):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def close(self) -> None:
+        self.loader.shutdown()
+        self.store.close()
+
+
+class ThumbnailViewer(QDockWidget):
+    """Grid of thumbnails of the pdfs in the current folder or of the papers
+    matching the tag query, a thumbnail opens its pdf
+
+    Args:
+        cache_dir (str, optional): directory of the thumbnails kept on disk.
+            Defaults to "thumbnails".
+    """
+
+    def __init__(
+        self,
+        parent,
+        comm: PMCommunicate,
+        db: PMDatabase,
+        *args,
+        cache_dir="thumbnails",
+        **kwargs,
+    ):
+        super().__init__("Thumbnails", parent, *args, **kwargs)
+        self.comm = comm
+        self.db = db
+        self.directory: typing.Optional[str] = None
+        self.paperIds = None  # papers matching the tag query, or None for all
+        self.setAllowedAreas(Qt.DockWidgetArea.AllDockWidgetAreas)
+        self.setFeatures(
+            QDockWidget.DockWidgetFeature.DockWidgetMovable
+            | QDockWidget.DockWidgetFeature.DockWidgetFloatable
+            | QDockWidget.DockWidgetFeature.DockWidgetClosable
+        )
+        self.model = ThumbnailModel(self, ThumbnailStore(cache_dir))
+        self.source = QComboBox(self)
+        self.source.addItems([FOLDER, PAPERS])
+        self.source.currentTextChanged.connect(self.reload)
+        self.view = QListView(self)
+        self.view.setModel(self.model)
+        self.view.setViewMode(QListView.ViewMode.IconMode)
+        self.view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.view.setMovement(QListView.Movement.Static)
+        self.view.setUniformItemSizes(True)
+        self.view.setWordWrap(True)
+        self.view.setIconSize(QSize(THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
+        self.view.setGridSize(QSize(THUMBNAIL_WIDTH + 24, THUMBNAIL_HEIGHT + 48))
+        self.view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.view.activated.connect(self.open_pdf)
+        self.w = QWidget(self)
+        self.w.setLayout(QVBoxLayout(self.w))
+        self.w.layout().addWidget(self.source)
+        self.w.layout().addWidget(self.view)
+        self.setWidget(self.w)
+
+        self.connect_signals()
+
+    def connect_signals(self):
+        self.comm.directory_selected.connect(self.show_directory)
+        self.comm.tag_query_changed.connect(self.show_papers)
+        self.comm.paper_tags_changed.connect(self.update_papers)
+        self.comm.library_updated.connect(self.reload)
+
+    def show_directory(self, path: str) -> None:
+        """Show the pdfs in the directory, when showing the current folder"""
+        if path == self.directory:
+            return
+        self.directory = path
+        if self.source.currentText() == FOLDER:
+            self.reload()
+
+    def show_papers(self, paperIds) -> None:
+        """Show the papers matching the tag query, when showing papers"""
+        self.paperIds = paperIds
+        if self.source.currentText() == PAPERS:
+            self.reload()
+
+    def update_papers(self, paperIds: list) -> None:
+        # Papers given their first tag or losing their last one
+        if self.source.currentText() == PAPERS:
+            self.reload()
+
+    def reload(self, *_) -> None:
+        if self.source.currentText() == PAPERS:
+            items = self.db.get_paper_files(self.paperIds)
+        else:
+            items = self.folder_items()
+        self.model.set_items(items)
+
+    def folder_items(self) -> list:
+        if self.directory is None:
+            return []
+        try:
+            with os.scandir(self.directory) as entries:
+                paths = sorted(
+                    posixpath.join(self.directory, entry.name)
+                    for entry in entries
+                    if entry.name.lower().endswith(".pdf") and entry.is_file()
+                )
+        except OSError:
+            return []
+        prehashes = self.db.get_prehashes(paths)
+        return [
+            (posixpath.basename(path), path, prehashes.get(path)) for path in paths
+        ]
+
+    def open_pdf(self, index: QModelIndex):
+        self.comm.open_pdf.emit(index.data(PathRole))
+
+    def close(self) -> None:
+        self.model.close()
@@ -0,0 +1,287 @@
+import os
+import mmap
+import struct
+import typing
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from . import workers
+from .hashing import prefilter_hash
+
+# Height in pixels of the thumbnail of the first page of a pdf
+THUMBNAIL_HEIGHT = 160
+PACK_FILE = "thumbnails.pack"
+INDEX_FILE = "thumbnails.index"
+# Index record: key, offset and length of the image in the pack file
+RECORD = struct.Struct("<16sQI")
+
+
+def thumbnail_key(identity: str, mtime_ns: int) -> bytes:
+    """Key of the thumbnail of a pdf
+
+    Args:
+        identity (str): prefilter hash of the content of the pdf, so copies
+            and moved files share their thumbnail
+        mtime_ns (int): modification time of the pdf
+
+    Returns:
+        bytes: 16-byte key
+    """
+    key = f"{identity}:{mtime_ns}".encode("utf-8", "surrogateescape")
+    return hashlib.blake2b(key, digest_size=16).digest()
+
+
+def pdf_thumbnail_key(
+    path: str, prehash: typing.Optional[str]
+) -> typing.Optional[bytes]:
+    """Key of the thumbnail of the pdf at path, read from the file
+
+    Args:
+        path (str): path to pdf
+        prehash (typing.Optional[str]): prefilter hash known to database, or
+            None if the pdf is not yet scanned and is hashed here
+
+    Returns:
+        typing.Optional[bytes]: key, or None if the pdf cannot be read
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    identity = prehash or prefilter_hash(path)
+    if identity is None:
+        return None
+    return thumbnail_key(identity, mtime_ns)
+
+
+def render_thumbnail(path: str, height: int = THUMBNAIL_HEIGHT) -> bytes:
+    """PNG of the first page of a pdf, run in a worker process
+
+    Args:
+        path (str): path to pdf
+        height (int, optional): height in pixels. Defaults to THUMBNAIL_HEIGHT.
+
+    Returns:
+        bytes: PNG image, empty if the pdf cannot be read
+    """
+    import fitz
+
+    try:
+        with fitz.open(path) as doc:
+            if not doc.page_count:
+                return b""
+            page = doc[0]
+            zoom = height / max(page.rect.height, 1)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return pix.tobytes("png")
+    except Exception:
+        return b""
+
+
+class ThumbnailStore:
+    """Thumbnails kept on disk in a single append-only pack file
+
+    Images are appended to the pack file and their key, offset and length to
+    a separate index of fixed-size records. The index is memory-mapped once
+    when opened to find every thumbnail, and the pack file is memory-mapped
+    to read them, so showing thumbnails does not open the pdfs again. An
+    image is written before its record, so an interrupted write leaves at
+    most unused bytes in the pack and a partial record that is dropped.
+    A thumbnail replaced after its pdf changed stays in the pack unused.
+
+    Args:
+        directory (str): directory of the pack and index files
+    """
+
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.pack = open(os.path.join(directory, PACK_FILE), "a+b")
+        self.index = open(os.path.join(directory, INDEX_FILE), "a+b")
+        self.entries = {}  # key to (offset, length) in pack file
+        self.view: typing.Optional[mmap.mmap] = None
+        self._read_index()
+
+    def _read_index(self) -> None:
+        pack_size = os.fstat(self.pack.fileno()).st_size
+        size = os.fstat(self.index.fileno()).st_size
+        size -= size % RECORD.size
+        # Drop a record partially written when the last write was interrupted
+        self.index.truncate(size)
+        if not size:
+            return
+        with mmap.mmap(self.index.fileno(), size, access=mmap.ACCESS_READ) as view:
+            for key, offset, length in RECORD.iter_unpack(view):
+                if offset + length <= pack_size:
+                    self.entries[key] = (offset, length)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.entries
+
+    def get(self, key: bytes) -> typing.Optional[bytes]:
+        """Get the image of the key
+
+        Returns:
+            typing.Optional[bytes]: image, empty if the pdf cannot be read,
+                or None if not in the store
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            offset, length = entry
+            if not length:
+                return b""
+            if self.view is None or offset + length > len(self.view):
+                # Map again to include the images appended since
+                if self.view is not None:
+                    self.view.close()
+                self.pack.flush()
+                size = os.fstat(self.pack.fileno()).st_size
+                self.view = mmap.mmap(
+                    self.pack.fileno(), size, access=mmap.ACCESS_READ
+                )
+            return self.view[offset : offset + length]
+
+    def put(self, key: bytes, image: bytes) -> None:
+        """Append the image of the key, replacing any previous one"""
+        with self.lock:
+            offset = self.pack.seek(0, os.SEEK_END)
+            self.pack.write(image)
+            self.pack.flush()
+            self.index.write(RECORD.pack(key, offset, len(image)))
+            self.index.flush()
+            self.entries[key] = (offset, len(image))
+
+    def close(self) -> None:
+        with self.lock:
+            if self.view is not None:
+                self.view.close()
+                self.view = None
+            self.pack.close()
+            self.index.close()
+
+
+class ThumbnailLoader(QObject):
+    """Render missing thumbnails in the process pool and add them to the store
+
+    Keys of thumbnails are read from the pdfs in a background thread too.
+
+    The latest requests are rendered first, as they are the thumbnails in
+    view, and only `workers.in_flight_limit()` are submitted at once, so
+    requests of thumbnails scrolled past can be cancelled. Renders failed as
+    a worker died, e.g. on a malformed pdf, are retried once in a new pool.
+
+    Args:
+        store (ThumbnailStore): store of thumbnails
+    """
+
+    ready = pyqtSignal(bytes, name="key of thumbnail added to store")
+    keyed = pyqtSignal(str, object, name="path and key of thumbnail or None")
+    _rendered = pyqtSignal(bytes, bytes, name="key and image of thumbnail")
+
+    def __init__(self, store: ThumbnailStore, parent=None) -> None:
+        super().__init__(parent)
+        self.store = store
+        # Reentrant, as a future done already runs its callback on submit
+        self.lock = threading.RLock()
+        self.pending = {}  # key to path, in order of request
+        self.running = {}  # key being rendered to its future
+        self.retried = set()  # keys whose render failed once
+        self.failed = set()  # keys whose render failed twice, not retried
+        self.keying = {}  # path to future of the key of its thumbnail
+        self.key_pool = ThreadPoolExecutor(1)
+        self.stopped = False
+        self.window = workers.in_flight_limit()
+        self._rendered.connect(self._add)
+
+    def request_key(self, path: str, prehash: typing.Optional[str]) -> None:
+        """Read the key of the thumbnail of the pdf at path, see `keyed`"""
+        with self.lock:
+            if self.stopped or path in self.keying:
+                return
+            future = self.key_pool.submit(pdf_thumbnail_key, path, prehash)
+            self.keying[path] = future
+        future.add_done_callback(lambda f, path=path: self._keyed(path, f))
+
+    def _keyed(self, path: str, future: Future) -> None:
+        # Called in the thread reading keys
+        with self.lock:
+            self.keying.pop(path, None)
+        if not future.cancelled():
+            self.keyed.emit(path, future.result())
+
+    def request(self, key: bytes, path: str) -> None:
+        """Render the thumbnail of the pdf at path, unless in store"""
+        if key in self.store:
+            return
+        with self.lock:
+            if key in self.running or key in self.failed:
+                return
+            self.pending.pop(key, None)
+            self.pending[key] = path
+        self._submit()
+
+    def cancel(self) -> None:
+        """Forget the thumbnails and keys requested and not yet started"""
+        with self.lock:
+            self.pending.clear()
+            keying = list(self.keying.values())
+        for future in keying:
+            future.cancel()
+
+    def _submit(self) -> None:
+        with self.lock:
+            while (
+                not self.stopped
+                and self.pending
+                and len(self.running) < self.window
+            ):
+                key = next(reversed(self.pending))
+                path = self.pending.pop(key)
+                future = workers.submit(render_thumbnail, path)
+                self.running[key] = future
+                future.add_done_callback(
+                    lambda f, key=key, path=path: self._done(key, path, f)
+                )
+
+    def _done(self, key: bytes, path: str, future: Future) -> None:
+        # Called in a thread of the process pool
+        if not future.cancelled() and future.exception() is None:
+            self._rendered.emit(key, future.result())
+            return
+        with self.lock:
+            self.running.pop(key, None)
+            if not future.cancelled() and not self.stopped:
+                if key in self.retried:
+                    self.failed.add(key)
+                else:
+                    self.retried.add(key)
+                    self.pending.setdefault(key, path)
+        self._submit()
+
+    def _add(self, key: bytes, image: bytes) -> None:
+        # Rendering until in store, so it is not requested again meanwhile
+        with self.lock:
+            self.running.pop(key, None)
+        if self.stopped:
+            return
+        self.store.put(key, image)
+        self.ready.emit(key)
+        self._submit()
+
+    def shutdown(self) -> None:
+        """Stop rendering, the process pool is shut down with the database"""
+        with self.lock:
+            self.stopped = True
+            self.pending.clear()
+            futures = list(self.running.values()) + list(self.keying.values())
+        for future in futures:
+            future.cancel()
+        self.key_pool.shutdown(wait=False)
@@ -0,0 +1,69 @@
+import bisect
+import heapq
+
+# Maximum number of tags suggested at a time
+MAX_SUGGESTIONS = 12
+
+
+class TagVocabulary:
+    """Tag names in use and their number of papers, for completion
+
+    Names are kept sorted by their case-folded form, so the tags starting
+    with a prefix are a contiguous range found by bisection. The vocabulary
+    is changed by deltas of counts as tags are added and removed, without
+    reading all tags again.
+    """
+
+    def __init__(self) -> None:
+        self.keys = []  # (case-folded name, name), sorted
+        self.counts = {}  # name to number of papers
+
+    def load(self, counts: dict) -> None:
+        """Replace the vocabulary
+
+        Args:
+            counts (dict): tag name to number of papers
+        """
+        self.counts = {name: n for name, n in counts.items() if n > 0}
+        self.keys = sorted((name.casefold(), name) for name in self.counts)
+
+    def apply_deltas(self, deltas: dict) -> None:
+        """Change the counts of tags, adding or removing tags as needed
+
+        Args:
+            deltas (dict): tag name to change in its number of papers
+        """
+        for name, delta in deltas.items():
+            before = self.counts.get(name, 0)
+            after = before + delta
+            key = (name.casefold(), name)
+            if after > 0:
+                self.counts[name] = after
+                if before <= 0:
+                    bisect.insort(self.keys, key)
+            elif before > 0:
+                del self.counts[name]
+                del self.keys[bisect.bisect_left(self.keys, key)]
+
+    def with_prefix(self, prefix: str) -> list:
+        """Get the tags starting with the prefix, ignoring case, by name"""
+        prefix = prefix.casefold()
+        lo = bisect.bisect_left(self.keys, (prefix,))
+        hi = bisect.bisect_left(self.keys, (prefix + "\U0010ffff",), lo)
+        return [name for _, name in self.keys[lo:hi]]
+
+    def suggest(self, prefix: str, limit=MAX_SUGGESTIONS, exclude=()) -> list:
+        """Get the most used tags starting with the prefix
+
+        Args:
+            prefix (str): start of tag name, case insensitive
+            limit (int, optional): Defaults to MAX_SUGGESTIONS.
+            exclude (tuple, optional): names not to suggest. Defaults to ().
+
+        Returns:
+            list: names, most used first
+        """
+        names = [name for name in self.with_prefix(prefix) if name not in exclude]
+        return heapq.nsmallest(
+            limit, names, key=lambda name: (-self.counts[name], name.casefold())
+        )
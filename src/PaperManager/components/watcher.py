@@ -0,0 +1,79 @@
+import time
+
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QThreadPool, QTimer
+
+from .signals import PMCommunicate
+from .database import PMDatabase
+from .tasks import PMIndexDirectories
+
+# Wait for this long without new events before indexing changed directories
+DEBOUNCE_MS = 300
+# But never delay indexing for longer than this under a stream of events
+MAX_DELAY_SEC = 1.5
+
+
+class PMLibraryWatcher(QObject):
+    """Watch directories under the project root and index changes to pdfs
+
+    Events on directories (pdfs created, renamed or deleted) are coalesced and
+    debounced, then the changed directories are rescanned in a single task so
+    that their changes are written to database in batched transactions.
+    """
+
+    def __init__(
+        self, parent, comm: PMCommunicate, db: PMDatabase, pool: QThreadPool
+    ) -> None:
+        super().__init__(parent)
+        self.comm = comm
+        self.db = db
+        self.pool = pool
+        self.root_dir = ""
+        self.pending = set()
+        self.pending_since = 0.0
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.index_pending)
+        self.comm.update_directory_done.connect(self.sync)
+        self.comm.library_updated.connect(lambda *_: self.sync(self.root_dir))
+
+    def set_root(self, root_dir: str) -> None:
+        """Stop watching the previous project and wait for the new one scanned
+
+        Args:
+            root_dir (str): resolved project directory
+        """
+        self.root_dir = root_dir
+        self.pending.clear()
+        self.timer.stop()
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+
+    def sync(self, root_dir: str) -> None:
+        """Watch exactly the directories of the project in the scan manifest"""
+        if not root_dir or root_dir != self.root_dir:
+            return
+        wanted = set(self.db.get_scanned_dirs(root_dir))
+        watched = set(self.watcher.directories())
+        if watched - wanted:
+            self.watcher.removePaths(list(watched - wanted))
+        if wanted - watched:
+            self.watcher.addPaths(list(wanted - watched))
+
+    def on_directory_changed(self, path: str) -> None:
+        if not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending.add(path)
+        # Restart the countdown unless indexing has been delayed for too long
+        waited = time.monotonic() - self.pending_since
+        if waited < MAX_DELAY_SEC or not self.timer.isActive():
+            self.timer.start(DEBOUNCE_MS)
+
+    def index_pending(self) -> None:
+        """Index all directories changed since last time in one task"""
+        if not self.pending:
+            return
+        task = PMIndexDirectories(self.comm, self.db, list(self.pending))
+        self.pending.clear()
+        self.pool.start(task)
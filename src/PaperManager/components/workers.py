@@ -0,0 +1,115 @@
+import os
+import typing
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Jobs submitted at once per worker process, to keep memory flat
+IN_FLIGHT_PER_WORKER = 2
+
+_process_pool: typing.Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """Get the process pool shared by all background jobs, started on first use
+
+    Hashing, text extraction and thumbnails run in the same worker processes,
+    so there is never more than one worker per core. A pool broken by a worker
+    that died is started again, see `discard`.
+    """
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            # Do not fork a process running Qt threads
+            context = multiprocessing.get_context("spawn")
+            _process_pool = ProcessPoolExecutor(mp_context=context)
+        return _process_pool
+
+
+def discard(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool, the next `process_pool()` starts a new one
+
+    A worker process that dies, e.g. killed when out of memory or crashing on
+    a malformed pdf, breaks its pool for good. Every job submitted to it then
+    fails with BrokenProcessPool.
+    """
+    global _process_pool
+    with _lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def submit(function: typing.Callable, *args) -> Future:
+    """Run a function in the process pool, started again if broken
+
+    Returns:
+        Future: result of the function, fails with BrokenProcessPool if a
+            worker dies meanwhile
+    """
+    pool = process_pool()
+    try:
+        return pool.submit(function, *args)
+    except BrokenProcessPool:
+        discard(pool)
+        return process_pool().submit(function, *args)
+
+
+def in_flight_limit() -> int:
+    """Number of jobs to keep submitted at once, see IN_FLIGHT_PER_WORKER"""
+    return IN_FLIGHT_PER_WORKER * (os.cpu_count() or 1)
+
+
+def map_windowed(
+    function: typing.Callable,
+    items: typing.Iterable,
+    stop: threading.Event,
+    argument: typing.Callable = lambda item: item,
+) -> typing.Iterator[tuple]:
+    """Run a function on items in the process pool, a few at a time
+
+    Only `in_flight_limit()` items are submitted at once, and each result is
+    yielded as soon as it is ready, so the memory used does not grow with the
+    number of items.
+
+    Args:
+        function (typing.Callable): function run in a worker process
+        items (typing.Iterable): items to run the function on
+        stop (threading.Event): set to stop early
+        argument (typing.Callable, optional): argument of the function for an
+            item. Defaults to the item itself.
+
+    Yields:
+        tuple: (item, result), in order of completion
+
+    Raises:
+        BrokenProcessPool: if a worker died, the items not yet yielded are
+            dropped
+    """
+    window = in_flight_limit()
+    todo = iter(items)
+    running = {}
+    while True:
+        while len(running) < window and not stop.is_set():
+            item = next(todo, None)
+            if item is None:
+                break
+            running[submit(function, argument(item))] = item
+        if not running:
+            return
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = running.pop(future)
+            if not stop.is_set():
+                yield item, future.result()
+
+
+def shutdown():
+    """Stop the worker processes, if any"""
+    global _process_pool
+    with _lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
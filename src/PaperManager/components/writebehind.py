@@ -0,0 +1,90 @@
+import threading
+from concurrent.futures import Future
+
+from PyQt6.QtCore import QThread, QTimer
+from PyQt6.QtSql import QSqlDatabase, QSqlQuery
+
+from .writer import PMDatabaseWriter, checked_exec_batch
+
+# Wait for this long after the last tag change before writing to database
+FLUSH_DELAY_MS = 500
+
+
+class TagWriteBehind:
+    """Tags added to or removed from papers but not yet written to database
+
+    Only the (paperId, tag) pairs changed since the last flush are kept.
+    They are written in a single transaction shortly after the last change,
+    so the cost of tagging does not depend on the size of the library.
+
+    Args:
+        writer (PMDatabaseWriter): writer thread of the database
+    """
+
+    def __init__(self, writer: PMDatabaseWriter) -> None:
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.added = set()  # (paperId, tag name)
+        self.removed = set()
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    def add(self, paperId: int, tag: str) -> None:
+        with self.lock:
+            self.removed.discard((paperId, tag))
+            self.added.add((paperId, tag))
+        self._schedule()
+
+    def remove(self, paperId: int, tag: str) -> None:
+        with self.lock:
+            self.added.discard((paperId, tag))
+            self.removed.add((paperId, tag))
+        self._schedule()
+
+    def _schedule(self) -> None:
+        # Changes made in other threads wait for the next flush
+        if QThread.currentThread() is self.timer.thread():
+            self.timer.start(FLUSH_DELAY_MS)
+
+    def flush(self) -> Future:
+        """Write pending changes to database
+
+        Returns:
+            Future: set once the changes are committed
+        """
+        self.timer.stop()
+        with self.lock:
+            added, self.added = self.added, set()
+            removed, self.removed = self.removed, set()
+        return self.writer.submit(lambda db: self._write(db, added, removed))
+
+    @staticmethod
+    def _write(db: QSqlDatabase, added: set, removed: set) -> None:
+        query = QSqlQuery(db)
+        if added:
+            paperIds, tags = map(list, zip(*added))
+            query.prepare("INSERT OR IGNORE INTO Tags(name) VALUES (?)")
+            query.addBindValue(list(set(tags)))
+            checked_exec_batch(query)
+            query.prepare(
+                """
+            INSERT OR IGNORE INTO PaperTags(paperId,tagId)
+            SELECT ?, id FROM Tags WHERE name=?
+            """
+            )
+            query.addBindValue(paperIds)
+            query.addBindValue(tags)
+            checked_exec_batch(query)
+        if removed:
+            paperIds, tags = map(list, zip(*removed))
+            query.prepare(
+                """
+            DELETE FROM PaperTags
+            WHERE paperId=? AND tagId=(SELECT id FROM Tags WHERE name=?)
+            """
+            )
+            query.addBindValue(paperIds)
+            query.addBindValue(tags)
+            checked_exec_batch(query)
+        query.finish()
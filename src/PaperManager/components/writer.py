@@ -0,0 +1,118 @@
+import queue
+import typing
+import threading
+from concurrent.futures import Future
+
+from PyQt6.QtSql import QSqlDatabase, QSqlQuery
+
+# Maximum number of queued write operations committed in one transaction
+MAX_GROUP_SIZE = 64
+
+
+def checked_exec(query: QSqlQuery, statement: typing.Optional[str] = None) -> None:
+    """Execute a statement, or the prepared one, of a write operation
+
+    Raises:
+        RuntimeError: if it fails, so the operation is rolled back
+    """
+    done = query.exec() if statement is None else query.exec(statement)
+    if not done:
+        raise RuntimeError(query.lastError().text())
+
+
+def checked_exec_batch(query: QSqlQuery) -> None:
+    """Execute the prepared statement of a write operation on each bound row
+
+    Raises:
+        RuntimeError: if it fails, so the operation is rolled back
+    """
+    if not query.execBatch():
+        raise RuntimeError(query.lastError().text())
+
+
+class PMDatabaseWriter(threading.Thread):
+    """The only thread that writes to database
+
+    Write operations are queued and run on the writer's own connection. The
+    operations waiting in the queue are committed together in a single
+    transaction, each in its own savepoint so that a failing one is rolled
+    back alone.
+
+    Args:
+        open_connection (typing.Callable): opens a named connection
+    """
+
+    def __init__(self, open_connection: typing.Callable[[str], QSqlDatabase]):
+        super().__init__(name="PaperManager database writer", daemon=True)
+        self.open_connection = open_connection
+        self.queue = queue.Queue()
+
+    def submit(self, op: typing.Callable[[QSqlDatabase], typing.Any]) -> Future:
+        """Queue a write operation
+
+        Args:
+            op (typing.Callable): called with the writer's connection
+
+        Returns:
+            Future: result of the operation, set once committed
+        """
+        future = Future()
+        self.queue.put((op, future))
+        return future
+
+    def stop(self) -> None:
+        """Commit all queued operations and stop the thread"""
+        self.queue.put(None)
+        self.join()
+
+    def run(self) -> None:
+        name = "PaperManager-writer"
+        db = self.open_connection(name)
+        stopping = False
+        while not stopping:
+            group = [self.queue.get()]
+            while len(group) < MAX_GROUP_SIZE:
+                try:
+                    group.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in group:
+                group.remove(None)
+                stopping = True
+            if group:
+                self._commit(db, group)
+        db.close()
+        del db
+        QSqlDatabase.removeDatabase(name)
+
+    @staticmethod
+    def _commit(db: QSqlDatabase, group: list) -> None:
+        """Run a group of operations in a single transaction"""
+        query = QSqlQuery(db)
+        db.transaction()
+        results = []
+        for op, future in group:
+            query.exec("SAVEPOINT op")
+            try:
+                result = op(db)
+            except Exception as error:
+                # Its frames would keep the connection in use once closed
+                error = error.with_traceback(None)
+                query.exec("ROLLBACK TO op")
+                query.exec("RELEASE op")
+                results.append((future, None, error))
+            else:
+                query.exec("RELEASE op")
+                results.append((future, result, None))
+        query.finish()
+        if not db.commit():
+            error = RuntimeError(db.lastError().text())
+            db.rollback()
+            for future, _, _ in results:
+                future.set_exception(error)
+            return
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)